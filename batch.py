@@ -0,0 +1,216 @@
+"""
+Batched playouts for connect four on NumPy. A whole batch of games
+from the same position is held as arrays of 64 bit bitboards and
+advanced one ply at a time, dropping games from the batch as they end.
+
+Requires NumPy and a board of at most 64 bits (7x6 takes 49, 8x7
+takes 64), a larger board raises ValueError.
+"""
+
+import numpy as np
+from playing.games.connect_four import STANDARD
+
+
+class Tables(object):
+
+    """
+    Bitboard constants of one board size as 64 bit NumPy numbers
+    """
+
+    __slots__ = ("geometry", "bottom", "full", "tops", "columns", "shifts")
+
+    def __init__(self, geometry):
+
+        """
+        :param geometry: Geometry of the board, of at most 64 bits
+        """
+
+        if geometry.width * geometry.column > 64:
+            raise ValueError("the numpy backend needs a board of at most 64 bits, %r takes %d"
+                             % (geometry, geometry.width * geometry.column))
+
+        column = geometry.column
+
+        self.geometry = geometry
+        self.bottom = np.uint64(geometry.bottom)
+        self.full = np.uint64(geometry.full)
+
+        # bit of the top cell of every column, set when the column is full
+        self.tops = np.array([1 << (col * column + geometry.height - 1) for col in range(geometry.width)],
+                             dtype=np.uint64)
+
+        # every cell of every column
+        self.columns = np.array(geometry.column_masks, dtype=np.uint64)
+
+        self.shifts = [np.uint64(shift) for shift in range(4 * (column + 1))]
+
+
+# tables of every board size in use, by Geometry
+TABLES = dict()
+
+
+def tables(geometry=STANDARD):
+
+    """
+    :param geometry: Geometry of the board
+    :return: The shared Tables of the board size
+    """
+
+    if geometry not in TABLES:
+        TABLES[geometry] = Tables(geometry)
+
+    return TABLES[geometry]
+
+
+def winning_cells(mask, taken, table):
+
+    """
+    Finds every empty cell that would complete a line of four,
+    for a whole array of bitboards at once
+
+    :param mask: Array of bitboards of the player
+    :param taken: Array of bitboards of every piece
+    :param table: Tables of the board size
+    :return: Array of bitboards of the empty cells that win for the player
+    """
+
+    shifts = table.shifts
+    column = table.geometry.column
+
+    # vertical
+    cells = (mask << shifts[1]) & (mask << shifts[2]) & (mask << shifts[3])
+
+    # horizontal and both diagonals, with the empty cell at any of the four places
+    for shift in (column, column - 1, column + 1):
+
+        one, two, three = shifts[shift], shifts[2 * shift], shifts[3 * shift]
+
+        pairs = (mask << one) & (mask << two)
+        cells |= pairs & ((mask << three) | (mask >> one))
+
+        pairs = (mask >> one) & (mask >> two)
+        cells |= pairs & ((mask << one) | (mask >> three))
+
+    return cells & (table.full ^ taken)
+
+
+class BatchRollout(object):
+
+    """
+    Plays many random games from one position at the same time, with the
+    policy of MonteCarlo.score: win if possible, otherwise a random column.
+    """
+
+    def __init__(self, seed=None):
+
+        """
+        :param seed: Seed for the NumPy random generator, None for a random seed
+        """
+
+        self.rng = np.random.default_rng(seed)
+
+    def play(self, masks, taken, count, side, games, table=None):
+
+        """
+        Plays out a batch of copies of one position
+
+        :param masks: MAX and MIN bitboards of the position
+        :param taken: Bitboard of every piece of the position
+        :param count: Number of pieces of the position
+        :param side: Side to move, 0 for MAX and 1 for MIN
+        :param games: Number of games in the batch
+        :param table: Tables of the board size, None for the standard board
+        :return: Array with the utility of every game (1 MAX won, -1 MIN won, 0 tie)
+        """
+
+        if table is None:
+            table = tables()
+
+        cells = table.geometry.cells
+        utilities = np.zeros(games, dtype=np.int8)
+
+        # games still running, with their boards
+        active = np.arange(games)
+        boards = [np.full(games, masks[0], dtype=np.uint64), np.full(games, masks[1], dtype=np.uint64)]
+        taken = np.full(games, taken, dtype=np.uint64)
+
+        while len(active):
+
+            playable = (taken + table.bottom) & table.full
+            won = (winning_cells(boards[side], taken, table) & playable) != 0
+
+            utilities[active[won]] = 1 if side == 0 else -1
+
+            # the last empty cell can only tie
+            if count == cells - 1:
+                break
+
+            # retire finished games
+            if won.any():
+                running = ~won
+                active = active[running]
+                boards[0] = boards[0][running]
+                boards[1] = boards[1][running]
+                taken = taken[running]
+                playable = playable[running]
+
+            # random legal column for every game
+            legal = (taken[:, None] & table.tops) == 0
+            draws = np.where(legal, self.rng.random(legal.shape), -1.0)
+            cols = draws.argmax(axis=1)
+
+            bits = playable & table.columns[cols]
+            boards[side] |= bits
+            taken |= bits
+
+            count += 1
+            side ^= 1
+
+        return utilities
+
+    def score(self, game, move, maximize, iterations):
+
+        """
+        Plays move in game and finishes the game iterations times,
+        scored like MonteCarlo.score
+
+        :param game: ConnectFour game
+        :param move: (row, col) move of the player
+        :param maximize: True if the moving player is MAX
+        :param iterations: Number of playouts
+        :return: Total score of the moving player (1 win, 0 tie, -1 loss per game),
+        the total of the empty cell counts MonteCarlo.score returns and the
+        number of games the moving player won and lost
+        """
+
+        (row, col) = move
+
+        table = tables(game.geometry)
+        geometry = table.geometry
+        cells = geometry.cells
+
+        last = col * geometry.column + geometry.height - 1 - row
+        bit = 1 << last
+
+        side = 0 if maximize else 1
+        masks = [game.max_mask, game.min_mask]
+        masks[side] |= bit
+        taken = masks[0] | masks[1]
+        count = game.count + 1
+
+        # empty cells above the bottom row, the ones the list layout shows as 0
+        heights = game.heights
+        heights[col] += 1
+        board_size = cells - count - heights.count(0)
+
+        if any(masks[side] & line == line for line in geometry.cell_lines[last]):
+            (wins, losses) = (iterations, 0)
+        elif count == cells:
+            (wins, losses) = (0, 0)
+        else:
+            utilities = self.play(masks, taken, count, side ^ 1, iterations, table)
+            if not maximize:
+                utilities = -utilities
+            (wins, losses) = (int((utilities > 0).sum()), int((utilities < 0).sum()))
+
+        return wins - losses, board_size * iterations, wins, losses
@@ -0,0 +1,584 @@
+"""
+Benchmarks for the connect four game and its players.
+
+run_suite() times move generation, children, win detection, playouts
+and exact solves on a fixed corpus of positions and writes the results
+as JSON, so runs from different commits can be compared:
+
+    python -m playing.utils.benchmark before.json
+    python -m playing.utils.benchmark after.json before.json
+
+The bench_* functions are one-off comparisons: the incremental win
+detection against the original full board scan, the nodes minimax searches with
+and without move ordering, and the memory a game takes against the
+original list layout. check_hashing() asserts that positions reached by
+transposed or mirrored move orders, or rebuilt from the list layout,
+are equal and hash alike.
+"""
+
+import json
+import platform
+import random
+import sys
+import tracemalloc
+from time import perf_counter, time
+from playing.games.connect_four import ConnectFour, check_victory
+from playing.games.solver import random_games
+from playing.players.minimax import MaxPlayer, MinPlayer, TranspositionTable
+from playing.players.montecarlo import MonteCarlo
+
+# pieces on the board of the corpus positions, the endgames
+# have 18 empty cells like the MonteCarlo switch to minimax
+STAGES = {"opening": 4, "midgame": 14, "endgame": 24}
+
+
+def random_positions(games, seed=0):
+
+    """
+    Plays random games and collects every position along the way
+
+    :param games: Number of random games to play
+    :param seed: Seed for the random move choices
+    :return: List of ConnectFour positions, including the finished ones
+    """
+
+    rng = random.Random(seed)
+
+    max_player = MaxPlayer()
+    min_player = MinPlayer()
+
+    positions = []
+
+    for x in range(games):
+
+        game = ConnectFour()
+        player, opponent = max_player, min_player
+
+        while game.utility() is None:
+
+            game = game.child(rng.choice(game.moves()), player)
+            positions.append(game)
+
+            player, opponent = opponent, player
+
+    return positions
+
+
+def per_call(function, items, repeat):
+
+    """
+    Times a function over a list of items
+
+    :param function: Function taking a single item
+    :param items: Items to call the function with
+    :param repeat: Number of passes over the items
+    :return: Average seconds per call
+    """
+
+    start = perf_counter()
+
+    for x in range(repeat):
+        for item in items:
+            function(item)
+
+    return (perf_counter() - start) / (repeat * len(items))
+
+
+def scan_victory(board):
+
+    """
+    The original check_victory(): scans every cell of a list layout board
+    for four in a row to the right, down and along both diagonals, then
+    for an empty cell. Kept as the baseline of bench_utility().
+
+    :param board: Board in the list layout
+    :return: 1 if MAX has won, -1 if MIN has won, 0 for a tie and None
+    if there are still moves left
+    """
+
+    height = len(board)
+    width = len(board[0])
+
+    for row in range(height):
+        for col in range(width):
+
+            player = board[row][col]
+
+            # not a player move
+            if player == 0 or player == 9:
+                continue
+
+            # look right
+            if col + 3 < width and player == board[row][col + 1] and player == board[row][col + 2]\
+                    and player == board[row][col + 3]:
+                return +1 if player == 1 else -1
+
+            if row + 3 < height:
+
+                # down
+                if player == board[row + 1][col] and player == board[row + 2][col] and player == board[row + 3][col]:
+                    return +1 if player == 1 else -1
+
+                # down and right
+                if col + 3 < width and player == board[row + 1][col + 1] and player == board[row + 2][col + 2]\
+                        and player == board[row + 3][col + 3]:
+                    return +1 if player == 1 else -1
+
+                # down and left
+                if col - 3 >= 0 and player == board[row + 1][col - 1] and player == board[row + 2][col - 2]\
+                        and player == board[row + 3][col - 3]:
+                    return +1 if player == 1 else -1
+
+    for row in range(height):
+        for col in range(width):
+            if board[row][col] == 0 or board[row][col] == 9:
+                return None
+
+    return 0
+
+
+def bench_utility(games=200, repeat=5, seed=0):
+
+    """
+    Compares the incremental utility() with the original full board scan,
+    scan_victory(), and with the bitboard check_victory() and full_utility()
+    on the same randomized positions, after making sure all of them agree
+    on every one.
+
+    :param games: Number of random games to collect positions from
+    :param repeat: Number of timed passes over the positions
+    :param seed: Seed for the random games
+    :return: Dictionary of seconds per call and the speedup
+    """
+
+    positions = random_positions(games, seed)
+    boards = [game.board for game in positions]
+
+    for (game, board) in zip(positions, boards):
+        if not game.utility() == scan_victory(board) == check_victory(board):
+            raise AssertionError("utility() disagrees with the board scan on " + str(board))
+
+    results = {
+        "positions": len(positions),
+        "scan_victory": per_call(scan_victory, boards, repeat),
+        "check_victory": per_call(check_victory, boards, repeat),
+        "full_utility": per_call(ConnectFour.full_utility, positions, repeat),
+        "utility": per_call(ConnectFour.utility, positions, repeat),
+    }
+    results["speedup"] = results["scan_victory"] / results["utility"]
+
+    print("positions:", results["positions"])
+    for name in ("scan_victory", "check_victory", "full_utility", "utility"):
+        print(name, "%.3f us per call" % (results[name] * 1e6))
+    print("speedup over scan_victory: %.1fx" % results["speedup"])
+
+    return results
+
+
+def transpose(game, rng, tries=100):
+
+    """
+    Finds another random move order that reaches the same position: every
+    move drops the player to move into a column whose next cell holds a
+    piece of that player in game
+
+    :param game: ConnectFour position
+    :param rng: random.Random for the move choices
+    :param tries: Move orders to try before giving up
+    :return: ConnectFour position built by the new move order, None if
+    every try got stuck
+    """
+
+    max_player = MaxPlayer()
+    min_player = MinPlayer()
+
+    tables = game.geometry
+
+    for x in range(tries):
+
+        built = ConnectFour(width=tables.width, height=tables.height)
+
+        while built.count < game.count:
+
+            (player, mask) = (max_player, game.max_mask) if built.count % 2 == 0 else (min_player, game.min_mask)
+
+            playable = built.playable()
+            columns = [col for col in range(tables.width) if playable & tables.column_masks[col] & mask]
+
+            if not columns:
+                break
+
+            built = built.drop(rng.choice(columns), player)
+
+        if built.count == game.count:
+            return built
+
+    return None
+
+
+def check_hashing(games=200, seed=0):
+
+    """
+    Checks that equality and hashing agree on every position of random
+    games reached in another move order, reached with the mirrored moves,
+    and rebuilt from the list layout with ConnectFour(board=...)
+
+    :param games: Number of random games to check the positions of
+    :param seed: Seed for the random games
+    :return: Dictionary of the number of positions and of transpositions checked
+    """
+
+    rng = random.Random(seed)
+
+    max_player = MaxPlayer()
+    min_player = MinPlayer()
+
+    checked = {"positions": 0, "transpositions": 0}
+
+    def same(game, other, how):
+
+        if not (game == other and other == game and hash(game) == hash(other)):
+            raise AssertionError(how + " disagrees on equality or hash with " + str(game.board))
+
+    for x in range(games):
+
+        game = ConnectFour()
+        mirrored = ConnectFour()
+        player, opponent = max_player, min_player
+
+        while game.utility() is None:
+
+            previous = game
+
+            (row, col) = rng.choice(game.moves())
+            game = game.drop(col, player)
+            mirrored = mirrored.drop(game.geometry.width - 1 - col, player)
+
+            player, opponent = opponent, player
+
+            same(game, mirrored, "the mirrored move order")
+            same(game, ConnectFour(board=game.board), "the board rebuilt from its list")
+            same(game, ConnectFour(board=mirrored.board), "the mirror image rebuilt from its list")
+
+            if game == previous:
+                raise AssertionError("a position equals the one before it")
+
+            transposed = transpose(game, rng)
+
+            if transposed is not None:
+                same(game, transposed, "a transposed move order")
+                checked["transpositions"] += 1
+
+            checked["positions"] += 1
+
+    print("positions:", checked["positions"], "transpositions:", checked["transpositions"])
+
+    return checked
+
+
+def bench_ordering(count=10, pieces=22, seed=0):
+
+    """
+    Solves the same endgame positions with and without move ordering
+    and reports the nodes searched.
+
+    :param count: Number of positions
+    :param pieces: Number of pieces on the board of every position
+    :param seed: Seed for the random games
+    :return: Dictionary of nodes and seconds for both searches
+    """
+
+    positions = random_games(count, pieces, seed)
+
+    results = {"positions": len(positions)}
+
+    for ordering in (False, True):
+
+        nodes = 0
+        start = perf_counter()
+
+        for game in positions:
+
+            table = TranspositionTable()
+            max_player = MaxPlayer(table, ordering=ordering)
+            min_player = MinPlayer(table, ordering=ordering)
+            max_player.assume(min_player)
+            min_player.assume(max_player)
+
+            # MAX moves first, so MAX is to move after an even number of pieces
+            player = max_player if game.count % 2 == 0 else min_player
+            player.move(game)
+
+            nodes += player.searched()
+
+        name = "ordered" if ordering else "unordered"
+        results[name] = {"nodes": nodes, "seconds": perf_counter() - start}
+
+        print(name, nodes, "nodes in %.2f seconds" % results[name]["seconds"])
+
+    print("node reduction: %.1fx" % (results["unordered"]["nodes"] / results["ordered"]["nodes"]))
+
+    return results
+
+
+class ListGame(object):
+
+    """
+    A game in the original layout: an instance __dict__, a list of
+    lists board and a reference to the Player who made the last move
+    """
+
+    def __init__(self, last_player, board):
+        self.board = board
+        self.player = last_player
+
+
+def bytes_per_node(build, nodes):
+
+    """
+    Measures the memory held by a list of nodes
+
+    :param build: Function making the node with a given index
+    :param nodes: Number of nodes to keep alive
+    :return: Bytes allocated per node
+    """
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    kept = [build(index) for index in range(nodes)]
+
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # not counting the list holding the nodes
+    return (after - before - kept.__sizeof__()) / nodes
+
+
+def bench_memory(nodes=1000000, seed=0):
+
+    """
+    Reports the bytes per node of the list layout and of ConnectFour,
+    keeping nodes children of midgame positions alive at once
+
+    :param nodes: Number of nodes
+    :param seed: Seed for the random positions
+    :return: Dictionary of bytes per node for both layouts
+    """
+
+    positions = random_games(64, 12, seed)
+    player = MaxPlayer()
+
+    boards = [game.board for game in positions]
+    moves = [game.moves()[0] for game in positions]
+
+    def list_node(index):
+
+        # what child() did before: copy the board and set one cell
+        board = [row[:] for row in boards[index % len(boards)]]
+        (row, col) = moves[index % len(moves)]
+        board[row][col] = 1
+
+        return ListGame(player, board)
+
+    def compact_node(index):
+        return positions[index % len(positions)].child(moves[index % len(moves)], player)
+
+    results = {
+        "nodes": nodes,
+        "list": bytes_per_node(list_node, nodes),
+        "compact": bytes_per_node(compact_node, nodes),
+    }
+
+    print("list layout: %.0f bytes per node" % results["list"])
+    print("ConnectFour: %.0f bytes per node" % results["compact"])
+    print("at %d nodes: %.0f MB against %.0f MB" % (nodes, results["list"] * nodes / 2 ** 20,
+                                                    results["compact"] * nodes / 2 ** 20))
+
+    return results
+
+
+def corpus(count=8, seed=0):
+
+    """
+    Builds the fixed positions of the suite
+
+    :param count: Positions per stage
+    :param seed: Seed for the random games
+    :return: Dictionary of stage name to list of positions
+    """
+
+    return dict((stage, random_games(count, pieces, seed)) for (stage, pieces) in STAGES.items())
+
+
+def measure(function, items, repeat=1):
+
+    """
+    Times a function over items and records its peak memory
+
+    :param function: Function taking a single item, returning the units of work it did
+    :param items: Items to call the function with
+    :param repeat: Number of timed passes over the items
+    :return: Dictionary of units, seconds, units per second and peak bytes
+    """
+
+    units = 0
+    start = perf_counter()
+
+    for x in range(repeat):
+        for item in items:
+            units += function(item)
+
+    seconds = perf_counter() - start
+
+    # one more pass under tracemalloc, which would distort the timing
+    tracemalloc.start()
+    for item in items:
+        function(item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"units": units, "seconds": seconds, "per_second": units / seconds, "peak_bytes": peak}
+
+
+def moves_task(game):
+    game.moves()
+    return 1
+
+
+def child_task(game):
+
+    player = MaxPlayer() if game.count % 2 == 0 else MinPlayer()
+
+    for move in game.moves():
+        game.child(move, player)
+
+    return len(game.moves())
+
+
+def check_victory_task(board):
+    check_victory(board)
+    return 1
+
+
+def utility_task(game):
+    game.utility()
+    return 1
+
+
+def score_task(item):
+
+    (player, game, playouts) = item
+
+    move = game.moves()[0]
+    for x in range(playouts):
+        player.score(move, game)
+
+    return playouts
+
+
+def solve_task(game):
+
+    table = TranspositionTable()
+
+    max_player = MaxPlayer(table)
+    min_player = MinPlayer(table)
+    max_player.assume(min_player)
+    min_player.assume(max_player)
+
+    player = max_player if game.count % 2 == 0 else min_player
+    player.value(game)
+
+    return player.searched()
+
+
+def run_suite(path=None, count=8, playouts=200, seed=0):
+
+    """
+    Runs every benchmark of the suite on the corpus
+
+    :param path: JSON file to write the results to, None to only return them
+    :param count: Positions per stage of the corpus
+    :param playouts: Playouts per position for MonteCarlo.score
+    :param seed: Seed for the corpus and the playouts
+    :return: Dictionary of results: per benchmark and stage the units of work
+    (calls, children, playouts or nodes), seconds, units per second and peak bytes
+    """
+
+    positions = corpus(count, seed)
+
+    max_monte = MonteCarlo(True)
+    min_monte = MonteCarlo(False)
+    max_monte.assume(min_monte)
+    min_monte.assume(max_monte)
+
+    random.seed(seed)
+
+    results = {
+        "time": time(),
+        "python": platform.python_version(),
+        "corpus": {"count": count, "seed": seed, "stages": STAGES},
+        "benchmarks": {},
+    }
+
+    for (stage, games) in positions.items():
+
+        boards = [game.board for game in games]
+        scores = [(max_monte if game.count % 2 == 0 else min_monte, game, playouts) for game in games]
+
+        stage_results = {
+            "moves": measure(moves_task, games, 1000),
+            "child": measure(child_task, games, 200),
+            "check_victory": measure(check_victory_task, boards, 1000),
+            "utility": measure(utility_task, games, 1000),
+            "score": measure(score_task, scores),
+        }
+
+        # exact solves are only feasible close to the end of the game
+        if stage == "endgame":
+            stage_results["solve"] = measure(solve_task, games)
+
+        for (name, result) in stage_results.items():
+            results["benchmarks"].setdefault(name, {})[stage] = result
+
+    if path is not None:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    return results
+
+
+def compare(old, new):
+
+    """
+    Prints the speed and memory of every benchmark of two runs
+
+    :param old: Results of the earlier run
+    :param new: Results of the later run
+    """
+
+    for name in sorted(new["benchmarks"]):
+        for (stage, result) in sorted(new["benchmarks"][name].items()):
+
+            before = old["benchmarks"].get(name, {}).get(stage)
+
+            line = "%-14s %-8s %12.0f/s %10d bytes" % (name, stage, result["per_second"], result["peak_bytes"])
+
+            if before is not None:
+                line += "   %5.2fx speed  %5.2fx memory" % (result["per_second"] / before["per_second"],
+                                                          result["peak_bytes"] / max(1, before["peak_bytes"]))
+
+            print(line)
+
+
+if __name__ == "__main__":
+
+    # arguments: file to write the results to, then optionally a
+    # file with earlier results to compare against
+    current = run_suite(sys.argv[1] if len(sys.argv) > 1 else None)
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            compare(json.load(f), current)
+    else:
+        compare(current, current)
@@ -0,0 +1,164 @@
+"""
+Playout statistics kept across moves and games. MonteCarlo records the
+outcomes of the playouts of every position it samples, and the next
+search that meets the position, in the same game or a later one, starts
+from them instead of from nothing.
+
+The cache holds a fixed number of positions and evicts the one used
+least recently. It can be saved to a file between runs and loaded back
+in one read, in the layout of the book files (see solver).
+"""
+
+import os
+from collections import OrderedDict
+from playing.games.connect_four import STANDARD, geometry
+from playing.games.solver import HEADER, record_format, write_book
+
+MAGIC = b"C4PC"
+VERSION = 1
+
+# record fields after the key: visits, then the wins, draws and losses of
+# the player who made the last move, summed over the playouts
+FIELDS = "Qddd"
+
+
+class PositionCache(object):
+
+    """
+    Least recently used map of canonical position key to a list of the
+    visits, wins, draws and losses of the position. The outcomes count
+    for the player who moved into the position, so the statistics do not
+    depend on which player sampled them. A playout that ends in an
+    evaluation between -1 and 1 counts as that much of a win or a loss
+    and the rest of a draw.
+
+    Only players with the same playout settings should share a cache.
+    """
+
+    def __init__(self, capacity=1024 * 1024, tables=STANDARD):
+
+        """
+        :param capacity: Most positions kept
+        :param tables: Geometry of the positions
+        """
+
+        self.capacity = capacity
+        self.geometry = tables
+        self.entries = OrderedDict()
+
+        # lookups that found a position and that did not
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+
+        """
+        Looks up a position and marks it as used
+
+        :param key: Canonical key of the position
+        :return: List of visits, wins, draws and losses, or None
+        """
+
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+
+        return entry
+
+    def add(self, key, visits, wins, draws, losses):
+
+        """
+        Adds the outcomes of playouts of a position
+
+        :param key: Canonical key of the position
+        :param visits: Number of playouts
+        :param wins: Wins of the player who moved into the position
+        :param draws: Draws
+        :param losses: Losses of the player who moved into the position
+        """
+
+        entry = self.entries.get(key)
+
+        if entry is None:
+
+            self.entries[key] = [visits, wins, draws, losses]
+
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+            return
+
+        entry[0] += visits
+        entry[1] += wins
+        entry[2] += draws
+        entry[3] += losses
+
+        self.entries.move_to_end(key)
+
+    def clear(self):
+        self.entries.clear()
+
+    def save(self, path):
+
+        """
+        Writes the cache to a file, least recently used first so loading
+        it restores the order. The file is replaced in one step, a reader
+        never sees half of it.
+
+        :param path: File to write
+        """
+
+        records = [(key, *entry) for (key, entry) in self.entries.items()]
+
+        write_book(path + ".tmp", records, 0, self.geometry, MAGIC, VERSION, FIELDS)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, capacity=None):
+
+        """
+        Reads a cache written by save()
+
+        :param path: File to read
+        :param capacity: Most positions kept, None for the number in the file
+        or the default, whichever is larger
+        :return: PositionCache
+        """
+
+        with open(path, "rb") as f:
+            data = f.read()
+
+        (magic, version, width, height, depth, count) = HEADER.unpack_from(data, 0)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + " is not a connect four position cache")
+
+        tables = geometry(width, height)
+        record = record_format(tables, FIELDS)
+
+        if capacity is None:
+            capacity = max(count, 1024 * 1024)
+
+        cache = cls(capacity, tables)
+
+        # the most recently used positions come last, keep those
+        start = HEADER.size + max(0, count - capacity) * record.size
+        end = HEADER.size + count * record.size
+
+        from_bytes = int.from_bytes
+        cache.entries = OrderedDict((from_bytes(key, "big"), [visits, wins, draws, losses])
+                                    for (key, visits, wins, draws, losses)
+                                    in record.iter_unpack(memoryview(data)[start:end]))
+
+        return cache
@@ -4,67 +4,402 @@ connect four game, where the object of the game is to be the
 first player to get 4 pieces in a row in any direction.
 """
 
-from copy import deepcopy
+import random
 from playing.utils.framework import Game
 
 # Author: Dylan DeChiara
 # Date: 3/11/19
 # Version: 1.0
 
+class Geometry(object):
+
+    """
+    Bitboard layout and precomputed tables of one board size. Built once
+    per size by geometry() and shared by every game of that size.
+
+    Every column takes height + 1 bits, starting with the bottom cell. The
+    spare bit on top of each column keeps the columns apart so that shifting
+    a mask never wraps a line from one column into the next.
+    """
+
+    __slots__ = ("width", "height", "column", "bottom", "full", "column_cells", "cells", "directions",
+                 "lines", "cell_lines", "starts", "zobrist", "mirror_bits", "column_masks", "center_order",
+                 "cell_moves", "cell_columns", "scan_bands", "odd_rows", "layers", "row_bits", "row_masks")
+
+    def __init__(self, width, height):
+
+        """
+        :param width: Number of columns
+        :param height: Number of rows
+        """
+
+        self.width = width
+        self.height = height
+        self.column = height + 1
+
+        bits = width * self.column
+
+        # one bit in the bottom cell of every column
+        self.bottom = sum(1 << (col * self.column) for col in range(width))
+
+        # every playable cell of the first column, and of the board
+        self.column_cells = (1 << height) - 1
+        self.full = self.bottom * self.column_cells
+
+        # number of cells, a game with this many pieces is over
+        self.cells = width * height
+
+        # shifts for the vertical, horizontal and both diagonal directions
+        self.directions = (1, self.column, self.column - 1, self.column + 1)
+
+        # every line of four cells on the board as a bitboard, and the
+        # start bits of the lines in each direction as one bitboard
+        self.lines = []
+        starts = dict((shift, 0) for shift in self.directions)
+
+        for col in range(width):
+            for row in range(height):
+                for (dc, dh, shift) in ((0, 1, 1), (1, 0, self.column), (1, 1, self.column + 1),
+                                        (1, -1, self.column - 1)):
+
+                    cells = [(col + i * dc, row + i * dh) for i in range(4)]
+
+                    if all(0 <= c < width and 0 <= h < height for (c, h) in cells):
+                        self.lines.append(sum(1 << (c * self.column + h) for (c, h) in cells))
+                        starts[shift] |= 1 << (col * self.column + row)
+
+        self.starts = tuple(starts.items())
+
+        # lines passing through each bit of the bitboard
+        self.cell_lines = [tuple(line for line in self.lines if line >> bit & 1) for bit in range(bits)]
+
+        # Zobrist keys: a random 64 bit number for a MAX piece ([0]) and
+        # a MIN piece ([1]) on every bit, fixed so hashes are reproducible
+        self.zobrist = [[random.Random(side * 1000 + bit).getrandbits(64) for bit in range(bits)]
+                        for side in range(2)]
+
+        # bit of the mirror image of every bit
+        self.mirror_bits = [(width - 1 - bit // self.column) * self.column + bit % self.column for bit in range(bits)]
+
+        # every playable cell of every column
+        self.column_masks = [self.column_cells << (col * self.column) for col in range(width)]
+
+        # columns from the center outwards, the left one first on a tie
+        self.center_order = sorted(range(width), key=lambda col: abs(2 * col - (width - 1)))
+
+        # (row, col) move and column of every cell, keyed by the bitboard of the cell
+        self.cell_moves = dict((1 << (col * self.column + h), (height - 1 - h, col))
+                               for col in range(width) for h in range(height))
+        self.cell_columns = dict((cell, move[1]) for (cell, move) in self.cell_moves.items())
+
+        # cells in the order the original row-major board scan found moves in:
+        # it found the move of a column while scanning the top piece of it, so by
+        # rows from the top, with the two bottom rows together, and left to right
+        self.scan_bands = [sum(1 << (col * self.column + h) for col in range(width) for h in range(height)
+                               if min(height - h, height - 1) == band)
+                           for band in sorted(set(min(height - h, height - 1) for h in range(height)))]
+
+        # cells on the odd rows counting from the bottom (1, 3, 5 ...)
+        self.odd_rows = self.bottom * sum(1 << h for h in range(0, height, 2))
+
+        # cells grouped by the number of lines through them, center cells lie on the most
+        layers = dict()
+        for bit in range(bits):
+            if self.full >> bit & 1:
+                layers[len(self.cell_lines[bit])] = layers.get(len(self.cell_lines[bit]), 0) | 1 << bit
+
+        self.layers = tuple(layers.items())
+
+        # bit of every cell of every row of the list layout, top row first
+        self.row_bits = [tuple(1 << (col * self.column + height - 1 - row) for col in range(width))
+                         for row in range(height)]
+
+        # MAX and MIN bits of every row of the list layout, by the tuple of
+        # its cells, filled in by board_masks() as rows are met, at most
+        # 4 ** width rows each since a cell holds 0, 1, 2 or 9
+        self.row_masks = [dict() for row in range(height)]
+
+    def __repr__(self):
+        return "geometry(%d, %d)" % (self.width, self.height)
+
+    def __reduce__(self):
+
+        # a copy in another process uses the tables cached there
+        return geometry, (self.width, self.height)
+
+
+# tables of every board size in use, by (width, height)
+GEOMETRIES = dict()
+
+
+def geometry(width=7, height=6):
+
+    """
+    :param width: Number of columns
+    :param height: Number of rows
+    :return: The shared Geometry of the board size
+    """
+
+    key = (width, height)
+
+    if key not in GEOMETRIES:
+
+        if width < 1 or height < 1:
+            raise ValueError("a board needs at least one row and one column")
+
+        GEOMETRIES[key] = Geometry(width, height)
+
+    return GEOMETRIES[key]
+
+
 HEIGHT = 6
 WIDTH = 7
 
-# generate playing board as a 2d array based
-# on both height and width
+# the standard board
+STANDARD = geometry(WIDTH, HEIGHT)
 
-BOARD = []
-for x in range(HEIGHT):
 
-    if x == HEIGHT - 1:
-        r = []
-        for v in range(WIDTH):
-            r.append(9)
-    else:
-        r = []
-        for v in range(WIDTH):
-            r.append(0)
+def new_board(width=WIDTH, height=HEIGHT):
+
+    """
+    Builds an empty board in the list layout
+
+    :param width: Number of columns
+    :param height: Number of rows
+    :return: New 2d list of rows, 9 in the bottom row and 0 elsewhere
+    """
+
+    return [[9 if row == height - 1 else 0 for col in range(width)] for row in range(height)]
 
-    BOARD.append(r)
 
 class ConnectFour(Game):
 
     """
     The ConnectFour class takes a Game object and outlines all the needed attributes
-    to both play out and evaluate the game during any instance
+    to both play out and evaluate the game during any instance.
+
+    The board is stored as two immutable bitboards (one integer mask per player,
+    bit col * (height + 1) + row from the bottom for every piece), the column
+    heights are read off them. The board size is given by a Geometry holding
+    the tables of that size, shared by every game of the size. Instead of the
+    Player who made the last move only whether it maximizes is kept, so a game
+    holds no references to other objects and a search tree of millions of games
+    stays small. The list layout is still available through the board property.
+
+    Equality and hashing treat a board and its mirror image as the same
+    position. Both are kept up to date by child(): the packed keys of the
+    board and its mirror decide equality, and Zobrist hashes (the XOR of a
+    random number per piece) of both give the hash.
     """
 
-    def __init__(self, last_player=None, board=BOARD):
-        self.board = board
-        self.player = last_player
+    __slots__ = ("geometry", "maximized", "max_mask", "min_mask", "last", "count",
+                 "code", "mirror_code", "zobrist", "mirror_zobrist")
+
+    def __init__(self, last_player=None, board=None, width=WIDTH, height=HEIGHT):
+
+        """
+        :param last_player: Player who made the last move, None at the start
+        :param board: 2d list of rows in the list layout to start from, whose
+        size decides the board size, None for an empty board
+        :param width: Number of columns of an empty board
+        :param height: Number of rows of an empty board
+        """
+
+        if board is not None:
+            (width, height) = (len(board[0]), len(board))
+
+        tables = self.geometry = geometry(width, height)
+
+        # True if MAX made the last move, None if unknown
+        self.maximized = None if last_player is None else last_player.maximizes()
+
+        if board is None:
+            (self.max_mask, self.min_mask, heights) = (0, 0, [])
+        else:
+            (self.max_mask, self.min_mask, heights) = from_board(board)
+
+        # unknown for a board built from a list, utility() scans the whole board
+        self.last = None
+        self.count = sum(heights)
+
+        # keys of the position and of its mirror image, kept up to date by child()
+        mirror_max = mirror(self.max_mask, tables)
+        mirror_min = mirror(self.min_mask, tables)
+
+        self.code = position_key(self.max_mask, self.min_mask, tables)
+        self.mirror_code = position_key(mirror_max, mirror_min, tables)
+
+        self.zobrist = zobrist(self.max_mask, self.min_mask, tables)
+        self.mirror_zobrist = zobrist(mirror_max, mirror_min, tables)
 
     def __eq__(self, other):
 
         """
         Determine if self (board) and other(board) are
-        equal
+        equal, a board and its mirror image count as equal
 
         :param other: board data structure we're comparing
         self.board to
         :return: true if equal false if not
         """
 
-        return self.board == other.board
+        return (min(self.code, self.mirror_code) == min(other.code, other.mirror_code) and
+                self.geometry is other.geometry)
 
     def __hash__(self):
 
         """
         Uniquely identifies a board with a hash value
 
-        :return: Hash value of self.board to provide a unique
-        identifier for the board itself
+        :return: Zobrist hash of the canonical orientation, the same
+        for a board and its mirror image
+        """
+
+        if self.mirror_code < self.code:
+            return self.mirror_zobrist
+
+        return self.zobrist
+
+    def key(self):
+
+        """
+        Packs the position into a single integer of width * (height + 1) bits,
+        the same for every move order that reaches it. Every column holds
+        MAX's pieces plus a marker bit on top of its highest piece.
+
+        :return: Integer key of the position
+        """
+
+        return self.code
+
+    def canonical_key(self):
+
+        """
+        Key shared by the position and its left-right mirror image, for
+        caches and books. Moves stored under it should go through orient().
+
+        :return: The smaller of the position key and the mirrored key
+        """
+
+        return min(self.code, self.mirror_code)
+
+    def mirrored(self):
+
+        """
+        :return: True if the canonical key is the key of the mirror image
+        """
+
+        return self.mirror_code < self.code
+
+    def orient(self, move):
+
+        """
+        Converts a move between this board and the canonical orientation,
+        so a move stored under the canonical key can be played on any board
+        with that key. Converting twice gives the move back.
+
+        :param move: (row, col) move
+        :return: The move mirrored if the canonical key is the mirrored key
+        """
+
+        if self.mirror_code < self.code:
+            return move[0], self.geometry.width - 1 - move[1]
+
+        return move
+
+    @property
+    def heights(self):
+
+        """
+        :return: New list of the number of pieces in every column
+        """
+
+        tables = self.geometry
+        taken = self.max_mask | self.min_mask
+
+        return [((taken >> (col * tables.column)) & tables.column_cells).bit_length() for col in range(tables.width)]
+
+    def height(self, col):
+
+        """
+        :param col: Column of the board
+        :return: Number of pieces in the column
+        """
+
+        tables = self.geometry
+
+        return (((self.max_mask | self.min_mask) >> (col * tables.column)) & tables.column_cells).bit_length()
+
+    @property
+    def board(self):
+
+        """
+        Board in the original list layout: a height x width list of rows (row 0
+        at the top) holding 1 for MAX, 2 for MIN, 9 for an empty bottom cell
+        and 0 for any other empty cell.
+
+        :return: Newly built 2d list of the current board
+        """
+
+        return to_board(self.max_mask, self.min_mask, self.geometry)
+
+    def playable(self):
+
+        """
+        The lowest empty cell of every column is the only bit of the column
+        that changes when one is added to the bottom cells
+
+        :return: Bitboard of the cells a piece can be dropped into, at most one per column
+        """
+
+        tables = self.geometry
+
+        return ((self.max_mask | self.min_mask) + tables.bottom) & tables.full
+
+    def columns(self, ordered=False):
+
+        """
+        Lighter move generation for engines
+
+        :param ordered: True to list the columns from the center outwards
+        :return: List of the columns that are not full, in the order of moves()
+        """
+
+        tables = self.geometry
+        playable = ((self.max_mask | self.min_mask) + tables.bottom) & tables.full
+
+        if ordered:
+            masks = tables.column_masks
+            return [col for col in tables.center_order if playable & masks[col]]
+
+        columns = []
+        cell_columns = tables.cell_columns
+
+        for band in tables.scan_bands:
+
+            cells = playable & band
+
+            while cells:
+                cell = cells & -cells
+                columns.append(cell_columns[cell])
+                cells ^= cell
+
+        return columns
+
+    def drop(self, col, player):
+
+        """
+        Plays a column, like child() with the row filled in
+
+        :param col: Column that is not full
+        :param player: current Player
+        :return: ConnectFour class object with the piece on top of the column
         """
 
-        return hash(str(self.board))
+        tables = self.geometry
+        cell = ((self.max_mask | self.min_mask) + tables.bottom) & tables.column_masks[col]
+
+        return self.place(cell.bit_length() - 1, player)
 
     def child(self, move, player):
 
@@ -77,32 +412,106 @@ class ConnectFour(Game):
         allowed to put a piece
         :param player: current Player with valid move that is being
          passed in
-        :return: ConnectFour class object with passed in player and a newly
-        generated deepcopied board (child) based on the move that has been passed in
+        :return: ConnectFour class object with the bitboards of this game
+        plus the piece placed by move, which is remembered for utility()
         """
 
         (row, col) = move
+        tables = self.geometry
+
+        return self.place(col * tables.column + tables.height - 1 - row, player)
 
-        copy_board = deepcopy(self.board)
+    def place(self, last, player):
+
+        """
+        Builds the child with one more piece
+
+        :param last: Bit index of the new piece
+        :param player: current Player
+        :return: ConnectFour class object with the piece added
+        """
+
+        tables = self.geometry
+        bit = 1 << last
+
+        game = self.__class__.__new__(self.__class__)
+        game.geometry = tables
+        game.last = last
+        game.count = self.count + 1
+
+        # the marker on top of the column moves up one cell
+        mirror_last = tables.mirror_bits[last]
+        mirror_bit = 1 << mirror_last
+        game.code = self.code + bit
+        game.mirror_code = self.mirror_code + mirror_bit
 
         # checks what player is playing
-        if player.maximizes():
-            copy_board[row][col] = 1
+        game.maximized = player.maximizes()
+
+        if game.maximized:
+            game.max_mask = self.max_mask | bit
+            game.min_mask = self.min_mask
+            game.code += bit
+            game.mirror_code += mirror_bit
+            side = 0
         else:
-            copy_board[row][col] = 2
+            game.max_mask = self.max_mask
+            game.min_mask = self.min_mask | bit
+            side = 1
+
+        keys = tables.zobrist[side]
+        game.zobrist = self.zobrist ^ keys[last]
+        game.mirror_zobrist = self.mirror_zobrist ^ keys[mirror_last]
 
-        return ConnectFour(player, copy_board)
+        return game
 
     def utility(self):
 
         """
         Determines if the game is over
+        Only the lines through the last move are checked, since any other
+        line of four would have ended the game before it.
+
+        :return: either 1 (maximized player has won), -1 (maximized player has lost), and 0 if
+        the game has ended in a tie
+        """
+
+        last = self.last
+
+        if last is None:
+            return self.full_utility()
+
+        tables = self.geometry
+
+        # only the player who made the last move can have won
+        if self.max_mask >> last & 1:
+
+            for line in tables.cell_lines[last]:
+                if self.max_mask & line == line:
+                    return +1
+
+        else:
+
+            for line in tables.cell_lines[last]:
+                if self.min_mask & line == line:
+                    return -1
+
+        if self.count == tables.cells:
+            return 0
+
+        return None
+
+    def full_utility(self):
+
+        """
+        Determines if the game is over by checking the whole board,
+        used when the last move is unknown
+
         :return: either 1 (maximized player has won), -1 (maximized player has lost), and 0 if
         the game has ended in a tie
         """
 
-        # -1 0 +1 for win / loss
-        return check_victory(self.board)
+        return masks_utility(self.max_mask, self.min_mask, self.geometry)
 
     def display(self):
 
@@ -113,131 +522,294 @@ class ConnectFour(Game):
         :return: User friendly observable version of the game and player moves
         """
 
+        board = self.board
+
         #player UI
         s = "  "
-        for p in range(WIDTH):
+        for p in range(self.geometry.width):
             s += str(p)
             s += " "
 
         print(s)
 
-        for row in range(HEIGHT):
+        for row in range(self.geometry.height):
 
             # player UI
             print(row, end=' ')
 
-            for col in range(WIDTH):
+            for col in range(self.geometry.width):
 
-                if self.board[row][col] == 1:
+                if board[row][col] == 1:
                     print("X", end=' ')
-                elif self.board[row][col] == 2:
+                elif board[row][col] == 2:
                     print("O", end=' ')
                 else:
                     print("-", end=' ')
             print()
 
-    def moves(self):
+    def moves(self, ordered=False):
 
         """
         Generate a list of moves based on the pieces on the board
         and the rules of connect four.
 
-        :return: A list of moves based on the locations of current
-        player (self) pieces on the board
+        :param ordered: True to list the moves from the center column outwards,
+        False for the order of the original row-major board scan
+        :return: A list of (row, col) moves, one for every column that
+        is not full
         """
 
-        moves = list()
+        tables = self.geometry
+        playable = ((self.max_mask | self.min_mask) + tables.bottom) & tables.full
+        cell_moves = tables.cell_moves
 
-        for row in range(HEIGHT):
-            for col in range(WIDTH):
+        if ordered:
+            masks = tables.column_masks
+            return [cell_moves[playable & masks[col]] for col in tables.center_order if playable & masks[col]]
 
-                move = (row, col)
+        moves = []
 
-                if self.board[row][col] == 9:
-                    moves.append(move)
+        for band in tables.scan_bands:
 
-                if self.board[row][col] == 1 or self.board[row][col] == 2:
+            cells = playable & band
 
-                    move = (row - 1, col)
+            while cells:
+                cell = cells & -cells
+                moves.append(cell_moves[cell])
+                cells ^= cell
 
-                    if self.board[row - 1][col] == 1 or self.board[row - 1][col] == 2:
+        return moves
 
-                        pass
 
-                    else:
+def connected(mask, tables=STANDARD):
 
-                        moves.append(move)
+    """
+    Determines if a bitboard holds four pieces in a row in any direction
 
-        return moves
+    :param mask: Bitboard of a single player
+    :param tables: Geometry of the board
+    :return: True if the mask contains a line of four, False if not
+    """
 
-def check_victory(board):
+    for shift in tables.directions:
+
+        pairs = mask & (mask >> shift)
+
+        if pairs & (pairs >> 2 * shift):
+            return True
+
+    return False
+
+
+def masks_utility(max_mask, min_mask, tables=STANDARD):
 
     """
-    Called by utility function.
+    Determines if a game is over by checking the whole board
 
-    Determines of there is either a win condition (game has been won or lost
-    depending on the player and if they have maximized) on the board,
-    open spots, or if there are no longer any open spots on the board
-    and therefore the game has resulted in a tie.
+    :param max_mask: Bitboard of the MAX player
+    :param min_mask: Bitboard of the MIN player
+    :param tables: Geometry of the board
+    :return: 1 if MAX has won, -1 if MIN has won, 0 for a full board and None otherwise
+    """
+
+    # -1 0 +1 for win / loss
+    if connected(max_mask, tables):
+        return +1
+
+    if connected(min_mask, tables):
+        return -1
+
+    if (max_mask | min_mask) == tables.full:
+        return 0
+
+    return None
+
+
+def position_key(max_mask, min_mask, tables=STANDARD):
 
-    :param board: Current board with designated moves from both players
-    :return: 1 if maximized player has won, -1 if non-maximized player has won (maximized player
-    lost), 0 if game finishes in a tie, and none if there are still moves left.
     """
+    Packs a position into one integer: MAX's pieces plus
+    a marker bit on top of every column
 
-    for row in range(HEIGHT):
-        for col in range(WIDTH):
+    :param max_mask: Bitboard of the MAX player
+    :param min_mask: Bitboard of the MIN player
+    :param tables: Geometry of the board
+    :return: Integer key of the position
+    """
 
-            player = board[row][col]
+    return max_mask | ((max_mask | min_mask) + tables.bottom)
 
-            # not a player move
-            if player == 0 or player == 9:
-                continue
 
-            # look right
-            if col + 3 < WIDTH and player == board[row][col + 1] and player == board[row][col + 2]\
-                    and player == board[row][col + 3]:
-                if player == 1:
-                    return +1
-                else:
-                    return -1
+def from_key(key, tables=STANDARD):
+
+    """
+    Unpacks a key made by position_key(): the marker is the highest bit
+    of every column and the pieces below it not in MAX's mask are MIN's
+
+    :param key: Integer key of a position
+    :param tables: Geometry of the board
+    :return: MAX mask and MIN mask
+    """
+
+    max_mask = 0
+    min_mask = 0
+
+    column = (1 << tables.column) - 1
+
+    for col in range(tables.width):
+
+        shift = col * tables.column
+        bits = (key >> shift) & column
+
+        cells = (1 << (bits.bit_length() - 1)) - 1
+
+        max_mask |= (bits & cells) << shift
+        min_mask |= (cells ^ (bits & cells)) << shift
+
+    return max_mask, min_mask
+
+
+def zobrist(max_mask, min_mask, tables=STANDARD):
+
+    """
+    Computes the Zobrist hash of a position from scratch
+
+    :param max_mask: Bitboard of the MAX player
+    :param min_mask: Bitboard of the MIN player
+    :param tables: Geometry of the board
+    :return: XOR of the Zobrist keys of every piece
+    """
+
+    value = 0
+
+    for bit in range(max(max_mask.bit_length(), min_mask.bit_length())):
+
+        if max_mask >> bit & 1:
+            value ^= tables.zobrist[0][bit]
+        elif min_mask >> bit & 1:
+            value ^= tables.zobrist[1][bit]
+
+    return value
+
+
+def mirror(mask, tables=STANDARD):
+
+    """
+    Reflects a bitboard left to right
+
+    :param mask: Bitboard
+    :param tables: Geometry of the board
+    :return: Bitboard with the columns in reverse order
+    """
+
+    width = tables.width
+    size = tables.column
+    column = (1 << size) - 1
+    mirrored = 0
+
+    for col in range(width):
+        mirrored |= ((mask >> (col * size)) & column) << ((width - 1 - col) * size)
+
+    return mirrored
+
+
+def board_masks(board, tables):
+
+    """
+    Converts a board in the list layout into bitboards a row at a time,
+    looking up the bits of rows that were converted before
+
+    :param board: 2d list of rows as built by new_board()
+    :param tables: Geometry of the board
+    :return: MAX mask and MIN mask
+    """
 
-            if row + 3 < HEIGHT:
+    max_mask = 0
+    min_mask = 0
 
-                # down
-                if player == board[row + 1][col] and player == board[row + 2][col] and player == board[row + 3][col]:
-                    if player == 1:
-                        return +1
-                    else:
-                        return -1
+    for (cells, bits, known) in zip(board, tables.row_bits, tables.row_masks):
 
-                # down and right
-                if col + 3 < WIDTH and player == board[row + 1][col + 1] and player == board[row + 2][col + 2]\
-                        and player == board[row + 3][col + 3]:
-                    if player == 1:
-                        return +1
-                    else:
-                        return -1
+        key = tuple(cells)
 
-                # down and left
-                if col - 3 >= 0 and player == board[row + 1][col - 1] and player == board[row + 2][col - 2] \
-                        and player == board[row + 3][col - 3]:
-                    if player == 1:
-                        return +1
-                    else:
-                        return -1
+        try:
+            (max_bits, min_bits) = known[key]
+        except KeyError:
+            max_bits = sum(bit for (cell, bit) in zip(cells, bits) if cell == 1)
+            min_bits = sum(bit for (cell, bit) in zip(cells, bits) if cell == 2)
+            known[key] = (max_bits, min_bits)
 
+        max_mask |= max_bits
+        min_mask |= min_bits
 
-        # # if no one has won yet
-    for row in range(HEIGHT):
-        for col in range(WIDTH):
-            if board[row][col] == 0 or board[row][col] == 9:
-                return None
+    return max_mask, min_mask
 
-    return 0
 
+def from_board(board):
 
+    """
+    Converts a board in the list layout into bitboards
+
+    :param board: 2d list of rows as built by new_board(), of any size
+    :return: MAX mask, MIN mask and the list of column heights
+    """
+
+    tables = geometry(len(board[0]), len(board))
+
+    (max_mask, min_mask) = board_masks(board, tables)
+
+    # a column is as high as its highest piece
+    pieces = max_mask | min_mask
+    heights = [(pieces >> (col * tables.column) & tables.column_cells).bit_length() for col in range(tables.width)]
+
+    return max_mask, min_mask, heights
+
+
+def to_board(max_mask, min_mask, tables=STANDARD):
+
+    """
+    Converts bitboards back into the list layout
+
+    :param max_mask: Bitboard of the MAX player
+    :param min_mask: Bitboard of the MIN player
+    :param tables: Geometry of the board
+    :return: 2d list of rows as built by new_board()
+    """
+
+    board = new_board(tables.width, tables.height)
+
+    for row in range(tables.height):
+        for col in range(tables.width):
+
+            bit = 1 << (col * tables.column + tables.height - 1 - row)
+
+            if max_mask & bit:
+                board[row][col] = 1
+            elif min_mask & bit:
+                board[row][col] = 2
 
+    return board
+
+def check_victory(board):
+
+    """
+    Called by utility function.
+
+    Determines of there is either a win condition (game has been won or lost
+    depending on the player and if they have maximized) on the board,
+    open spots, or if there are no longer any open spots on the board
+    and therefore the game has resulted in a tie.
+
+    The board is converted to bitboards, a row at a time from the rows
+    converted before, and checked with the line shifts of its Geometry,
+    so boards of any size work.
+
+    :param board: Current board with designated moves from both players
+    :return: 1 if maximized player has won, -1 if non-maximized player has won (maximized player
+    lost), 0 if game finishes in a tie, and none if there are still moves left.
+    """
 
+    tables = geometry(len(board[0]), len(board))
 
+    (max_mask, min_mask) = board_masks(board, tables)
 
+    return masks_utility(max_mask, min_mask, tables)
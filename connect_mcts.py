@@ -0,0 +1,14 @@
+from playing.games.connect_four import ConnectFour
+from playing.players.montecarlo import MonteCarlo
+from playing.players.mcts import MCTS
+
+
+
+mcts_player = MCTS(True, time_budget=2)
+monte_player = MonteCarlo(False)
+
+monte_player.assume(mcts_player)
+mcts_player.assume(monte_player)
+
+game = ConnectFour()
+game.play(mcts_player, monte_player)
\ No newline at end of file
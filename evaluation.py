@@ -0,0 +1,151 @@
+"""
+Static evaluation of connect four positions, for scoring games that are
+not over: at the depth limit of minimax or at the cutoff of a playout.
+
+Every term is counted over all the lines of four at once. The starts of
+the lines in one direction form a bitboard, and shifting a mask by one,
+two and three steps of the direction lines up the four cells of every
+line on its start bit, so a handful of bitwise operations per direction
+covers all 69 lines of the standard board. The start bitboards, rows and
+layers come from the Geometry of the board, so any size works.
+"""
+
+from playing.games.connect_four import STANDARD
+from playing.games.rollout import winning_cells
+
+# weights of the terms
+TWO = 1.0
+THREE = 4.0
+THREAT = 8.0
+PARITY = 8.0
+CENTER = 0.2
+IMMEDIATE = 1000.0
+
+# score at which the evaluation is halfway to a win
+SCALE = 50.0
+
+
+def ones(mask):
+    return bin(mask).count("1")
+
+
+# Python 3.10 and later count the bits natively
+if hasattr(int, "bit_count"):
+    ones = int.bit_count
+
+
+def lines(mine, theirs, tables=STANDARD):
+
+    """
+    Counts the lines of four the opponent has no piece in
+
+    :param mine: Bitboard of the player
+    :param theirs: Bitboard of the opponent
+    :param tables: Geometry of the board
+    :return: Number of those lines with two and with three pieces of the player
+    """
+
+    twos = 0
+    threes = 0
+
+    for (shift, starts) in tables.starts:
+
+        free = starts & ~(theirs | theirs >> shift | theirs >> 2 * shift | theirs >> 3 * shift)
+
+        a = mine
+        b = mine >> shift
+        c = mine >> 2 * shift
+        d = mine >> 3 * shift
+
+        three = (a & b & (c | d) | c & d & (a | b)) & free
+        two = ((a | b) & (c | d) | a & b | c & d) & free & ~three
+
+        twos += ones(two)
+        threes += ones(three)
+
+    return twos, threes
+
+
+def center(mask, tables=STANDARD):
+
+    """
+    :param mask: Bitboard of the player
+    :param tables: Geometry of the board
+    :return: Number of lines through every piece of the player, summed
+    """
+
+    return sum(weight * ones(mask & layer) for (weight, layer) in tables.layers)
+
+
+def score(mine, theirs, threats, rows, tables=STANDARD):
+
+    """
+    Scores the position of one player, ignoring whose turn it is
+
+    :param mine: Bitboard of the player
+    :param theirs: Bitboard of the opponent
+    :param threats: Bitboard of the empty cells that would win for the player
+    :param rows: Odd rows counting from the bottom for the player who moved
+    first, even rows for the other
+    :param tables: Geometry of the board
+    :return: Weighted sum of the open twos and threes, threats and center control
+    """
+
+    (twos, threes) = lines(mine, theirs, tables)
+
+    return (TWO * twos + THREE * threes + THREAT * ones(threats) + PARITY * ones(threats & rows) +
+            CENTER * center(mine, tables))
+
+
+def evaluate_masks(max_mask, min_mask, count, tables=STANDARD):
+
+    """
+    Evaluates a position that is not over
+
+    :param max_mask: Bitboard of MAX, who moves first
+    :param min_mask: Bitboard of MIN
+    :param count: Number of pieces on the board
+    :param tables: Geometry of the board
+    :return: Value for MAX strictly between -1 and 1
+    """
+
+    taken = max_mask | min_mask
+    playable = (taken + tables.bottom) & tables.full
+
+    max_threats = winning_cells(max_mask, taken, tables)
+    min_threats = winning_cells(min_mask, taken, tables)
+
+    # the first player's threats on the odd rows counting from the bottom
+    # (1, 3, 5 ...) tend to decide the end of the game, the second player's
+    # on the even rows
+    odd_rows = tables.odd_rows
+    even_rows = tables.full ^ odd_rows
+
+    value = (score(max_mask, min_mask, max_threats, odd_rows, tables) -
+             score(min_mask, max_mask, min_threats, even_rows, tables))
+
+    if count % 2 == 0:
+        (mover, waiting, sign) = (max_threats, min_threats, 1)
+    else:
+        (mover, waiting, sign) = (min_threats, max_threats, -1)
+
+    # the player to move wins at once, or the other player has two
+    # cells to win with and only one of them can be blocked
+    if mover & playable:
+        value += sign * IMMEDIATE
+    elif ones(waiting & playable) > 1:
+        value -= sign * IMMEDIATE
+
+    return value / (abs(value) + SCALE)
+
+
+def evaluate(game):
+
+    """
+    Heuristic for MiniMaxPlayer and the playout cutoff of MonteCarlo
+
+    :param game: ConnectFour game that is not over
+    :return: Value for MAX strictly between -1 and 1
+    """
+
+    return evaluate_masks(game.max_mask, game.min_mask, game.count, game.geometry)
@@ -17,6 +17,9 @@ class Game(object):
     needed for a Game object to function properly.
     """
 
+    # lets subclasses do without a per instance __dict__
+    __slots__ = ()
+
     # return whether this game is equivalent to another
     def __eq__(self, other):
         raise NotImplementedError
@@ -29,20 +32,27 @@ class Game(object):
     def utility(self):
         raise NotImplementedError
 
-    # Return a list of legal moves
-    def moves(self):
+    # Return a list of legal moves, with ordered set the ones
+    # most likely to be good first if the game can tell
+    def moves(self, ordered=False):
         raise NotImplementedError
 
     # Return a new game created by a move
     def child(self, move, player):
         raise NotImplementedError
 
+    # Convert a move between this game and the orientation its hash
+    # and equality are based on, for games that treat symmetric
+    # positions as equal
+    def orient(self, move):
+        return move
+
     # Print this game to the console
     def display(self):
         raise NotImplementedError
 
     # conduct this game
-    def play(self, max_player, min_player, interval=1):
+    def play(self, max_player, min_player, interval=1, log=None):
 
         """
         Conduct the specified game when given, a min and max player
@@ -50,13 +60,20 @@ class Game(object):
         :param max_player: A Player that Maximizes
         :param min_player: A Player that Minimizes
         :param interval: Generic sleep time
+        :param log: Optional writer the finished game is appended to with its
+        first position, moves, utility and seconds per move (see gamelog.GameWriter)
         :return: The varying states of the game: ie move results
-        per player and the finished state of the game.
+        per player and the finished state of the game. Returns the
+        search statistics of every move (see Player.instrument), None
+        for the moves of players that do not collect them.
         """
 
         print("Playing Game: ")
         self.display()
         moves = 0
+        stats = []
+        played = []
+        seconds_per_move = []
 
         game = self
         player, opponent = max_player, min_player
@@ -67,11 +84,20 @@ class Game(object):
             move = player.move(game)
             seconds = time() - start
 
+            played.append(move)
+            seconds_per_move.append(seconds)
+
             if player.maximizes():
                 print("MAX after ", seconds, " seconds: ")
             else:
                 print("MIN after ", seconds, " seconds: ")
 
+            if player.stats is None:
+                stats.append(None)
+            else:
+                stats.append(player.stats.as_dict())
+                print(player.stats)
+
             game = game.child(move, player)
             game.display()
             moves += 1
@@ -81,7 +107,91 @@ class Game(object):
 
         print("Game over with utility ", game.utility(), "after: ", moves, "moves.")
 
+        if log is not None:
+            log.write_game(self, played, game.utility(), seconds_per_move)
+
+        return stats
+
+
+
+
+# Statistics of the search behind a single move
+class Stats(object):
+
+    """
+    Counters a Player fills in while choosing a move, once
+    instrument() has been called on it. Players leave the
+    counters they have nothing to report for at zero.
+    """
+
+    __slots__ = ("nodes", "cutoffs", "hits", "misses", "playouts", "phases", "variation")
+
+    def __init__(self):
+        self.reset()
+
+    def __repr__(self):
+        return "Stats(nodes=%d, cutoffs=%d, hits=%d, misses=%d, playouts=%d, phases=%r, variation=%r)" % (
+            self.nodes, self.cutoffs, self.hits, self.misses, self.playouts, self.phases, self.variation)
+
+    def reset(self):
+
+        """
+        Clears every counter, done at the start of every move
+        """
+
+        # positions searched and searches cut off by alpha beta pruning
+        self.nodes = 0
+        self.cutoffs = 0
+
+        # cache lookups that did and did not spare a search
+        self.hits = 0
+        self.misses = 0
+
+        # games played out to the end
+        self.playouts = 0
+
+        # seconds spent per phase of the move, by phase name
+        self.phases = dict()
+
+        # moves the player expects to be played from the position, its own move first
+        self.variation = []
+
+    def timed(self, phase, seconds):
+
+        """
+        Adds time to a phase
+
+        :param phase: Name of the phase
+        :param seconds: Seconds spent in it
+        """
+
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def merge(self, other):
+
+        """
+        Adds the counters and phase times of another Stats,
+        like those of a helper player
+
+        :param other: Stats to add
+        """
+
+        self.nodes += other.nodes
+        self.cutoffs += other.cutoffs
+        self.hits += other.hits
+        self.misses += other.misses
+        self.playouts += other.playouts
+
+        for (phase, seconds) in other.phases.items():
+            self.timed(phase, seconds)
 
+    def as_dict(self):
+
+        stats = dict((name, getattr(self, name)) for name in self.__slots__)
+        stats["phases"] = dict(self.phases)
+        stats["variation"] = list(self.variation)
+
+        return stats
 
 
 # Super class for all players
@@ -91,6 +201,24 @@ class Player(object):
     The Player class is the super class for all other Player objects
     """
 
+    # statistics of the last move, None while instrumentation is off
+    stats = None
+
+    # switch collection of search statistics on or off
+    def instrument(self, enabled=True):
+
+        """
+        Switches the collection of search statistics for this player.
+        While it is off the players only pay for a check of self.stats.
+
+        :param enabled: True to collect statistics, False to stop
+        :return: The Stats every move resets and fills in, or None
+        """
+
+        self.stats = Stats() if enabled else None
+
+        return self.stats
+
     # return whether this player wants to maximize utility
     def maximizes(self):
         raise NotImplementedError
@@ -100,3 +228,25 @@ class Player(object):
         raise NotImplementedError
 
 
+# Stand in for a player that does not move here
+class Seat(Player):
+
+    """
+    The Seat class stands in for a player whose moves are made somewhere
+    else, by a client, a worker process or a game record being replayed,
+    wherever a child game needs the Player who made the move
+    """
+
+    def __init__(self, maximize):
+
+        """
+        :param maximize: True for MAX, False for MIN
+        """
+
+        self.maximize = maximize
+        self.opponent = None
+
+    def maximizes(self):
+        return self.maximize
+
+
@@ -0,0 +1,380 @@
+"""
+Compact binary game records. A file starts with a short header and
+holds any number of games, each one a record of its own that is written
+in one piece, so games can be appended to the file at any time, by
+Game.play, by the match runner or by several processes at once.
+
+A record is its length, the board size, the result and the number of
+moves, then one byte per move with the column of the move and, if they
+were timed, the seconds of every move as 32 bit floats. A game that did
+not start from the empty board also stores the key of its first
+position.
+
+read_games() streams the games of a file one at a time, and analyze()
+replays them through ConnectFour, checking every move, to tally results,
+moves and openings:
+
+    python -m playing.utils.gamelog games.c4g [plies]
+"""
+
+import struct
+import sys
+from collections import Counter
+from playing.games.connect_four import ConnectFour, geometry, from_key, position_key, to_board
+from playing.games.solver import key_size
+from playing.utils.framework import Seat
+
+# file header: magic and version
+HEADER = struct.Struct("<4sH")
+MAGIC = b"C4GL"
+VERSION = 1
+
+# record: length of the rest of the record, board width and height,
+# utility of the last position, flags and number of moves
+RECORD = struct.Struct("<IBBbBH")
+
+# flags of a record
+STARTED = 1
+TIMED = 2
+
+# utility of a game that was stopped before it was over
+UNFINISHED = -128
+
+
+def columns(moves):
+
+    """
+    :param moves: (row, col) moves
+    :return: Bytes with the column of every move
+    """
+
+    return bytes(move[1] for move in moves)
+
+
+def encode(moves, utility, seconds=None, start=None):
+
+    """
+    Packs one game into a record
+
+    :param moves: Bytes or list with the column of every move
+    :param utility: Utility of the last position, None if the game is not over
+    :param seconds: Seconds of every move, None if they were not timed
+    :param start: ConnectFour game the moves were played from, None for the
+    empty standard board
+    :return: Bytes of the record
+    """
+
+    if start is None:
+        start = ConnectFour()
+
+    tables = start.geometry
+    flags = 0
+    body = b""
+
+    if start.count:
+        flags |= STARTED
+        body += position_key(start.max_mask, start.min_mask, tables).to_bytes(key_size(tables), "big")
+
+    body += bytes(moves)
+
+    if seconds is not None:
+
+        if len(seconds) != len(moves):
+            raise ValueError("a game needs the seconds of every move or of none")
+
+        flags |= TIMED
+        body += struct.pack("<%df" % len(seconds), *seconds)
+
+    # the length counts the bytes after the length itself
+    head = RECORD.pack(RECORD.size - 4 + len(body), tables.width, tables.height,
+                       UNFINISHED if utility is None else utility, flags, len(moves))
+
+    return head + body
+
+
+class GameWriter(object):
+
+    """
+    Appends game records to a file. Every game is written with a single
+    write and flushed right away, so a reader sees whole games only and
+    several writers can append to the same file.
+    """
+
+    def __init__(self, path):
+
+        """
+        :param path: File to append to, created with its header if it is new or empty
+        """
+
+        self.path = path
+        self.file = open(path, "ab")
+
+        # number of games written by this writer
+        self.written = 0
+
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def write(self, moves, utility, seconds=None, start=None):
+
+        """
+        Appends one game
+
+        :param moves: Bytes or list with the column of every move
+        :param utility: Utility of the last position, None if the game is not over
+        :param seconds: Seconds of every move, None if they were not timed
+        :param start: ConnectFour game the moves were played from, None for the
+        empty standard board
+        """
+
+        self.file.write(encode(moves, utility, seconds, start))
+        self.file.flush()
+
+        self.written += 1
+
+    def write_game(self, start, moves, utility, seconds=None):
+
+        """
+        Appends a game played by Game.play
+
+        :param start: ConnectFour game the moves were played from
+        :param moves: (row, col) moves of the game
+        :param utility: Utility of the last position
+        :param seconds: Seconds of every move
+        """
+
+        self.write(columns(moves), utility, seconds, start)
+
+    def write_record(self, record):
+
+        """
+        Appends a game of the match runner
+
+        :param record: match.Record
+        """
+
+        self.write(record.moves, record.utility, record.latencies)
+
+
+class GameRecord(object):
+
+    """
+    One game read back from a file
+    """
+
+    __slots__ = ("geometry", "start", "moves", "utility", "seconds")
+
+    def __init__(self, tables, start, moves, utility, seconds):
+
+        """
+        :param tables: Geometry of the board
+        :param start: Key of the first position, None for the empty board
+        :param moves: Bytes with the column of every move
+        :param utility: Utility of the last position, None if the game is not over
+        :param seconds: Tuple with the seconds of every move, None if they were not timed
+        """
+
+        self.geometry = tables
+        self.start = start
+        self.moves = moves
+        self.utility = utility
+        self.seconds = seconds
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __repr__(self):
+        return "GameRecord(%r, moves=%s, utility=%r)" % (self.geometry, list(self.moves), self.utility)
+
+    def first(self):
+
+        """
+        :return: ConnectFour game the moves were played from
+        """
+
+        tables = self.geometry
+
+        if self.start is None:
+            return ConnectFour(width=tables.width, height=tables.height)
+
+        (max_mask, min_mask) = from_key(self.start, tables)
+
+        return ConnectFour(board=to_board(max_mask, min_mask, tables))
+
+    def replay(self):
+
+        """
+        Plays the moves through ConnectFour, MAX moving on an even
+        number of pieces
+
+        :return: Generator of the game before every move and the (row, col) move
+        """
+
+        max_player = Seat(True)
+        min_player = Seat(False)
+
+        game = self.first()
+
+        for column in self.moves:
+
+            if game.utility() is not None or column not in game.columns():
+                raise ValueError("illegal move in column %d after %d pieces" % (column, game.count))
+
+            move = (game.geometry.height - 1 - game.height(column), column)
+
+            yield game, move
+
+            game = game.child(move, max_player if game.count % 2 == 0 else min_player)
+
+        if game.utility() != self.utility:
+            raise ValueError("the record says %r, the replayed game %r" % (self.utility, game.utility()))
+
+
+def read_games(path):
+
+    """
+    Reads the games of a file one at a time, without loading the file.
+    A game cut short at the end of the file, by a writer that is still
+    writing it, is left out.
+
+    :param path: File written by GameWriter
+    :return: Generator of GameRecords
+    """
+
+    with open(path, "rb") as f:
+
+        header = f.read(HEADER.size)
+
+        if len(header) < HEADER.size or HEADER.unpack(header) != (MAGIC, VERSION):
+            raise ValueError(path + " is not a connect four game log")
+
+        while True:
+
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+
+            (length, width, height, utility, flags, count) = RECORD.unpack(head)
+
+            body = f.read(length - (RECORD.size - 4))
+            if len(body) < length - (RECORD.size - 4):
+                return
+
+            tables = geometry(width, height)
+            offset = 0
+
+            start = None
+            if flags & STARTED:
+                size = key_size(tables)
+                start = int.from_bytes(body[:size], "big")
+                offset = size
+
+            moves = body[offset:offset + count]
+            offset += count
+
+            seconds = None
+            if flags & TIMED:
+                seconds = struct.unpack_from("<%df" % count, body, offset)
+
+            yield GameRecord(tables, start, moves, None if utility == UNFINISHED else utility, seconds)
+
+
+def analyze(games, plies=4):
+
+    """
+    Replays games and tallies them
+
+    :param games: Iterable of GameRecords, such as read_games(path)
+    :param plies: Number of moves that make up an opening
+    :return: Dictionary with the number of games, the results (MAX wins, MIN
+    wins, ties and unfinished games), the number of moves, the games of every
+    length, the moves into every column, the moves into every column by ply,
+    the seconds spent by ply, and the openings (the first plies columns,
+    mirrored so the lower sequence of a pair of mirror images counts for both)
+    with their number of games and results
+    """
+
+    report = {
+        "games": 0,
+        "results": Counter(),
+        "moves": 0,
+        "lengths": Counter(),
+        "columns": Counter(),
+        "by_ply": dict(),
+        "seconds": dict(),
+        "openings": dict(),
+    }
+
+    for record in games:
+
+        width = record.geometry.width
+
+        report["games"] += 1
+        report["lengths"][len(record)] += 1
+
+        if record.utility is None:
+            result = "unfinished"
+        else:
+            result = {1: "max", -1: "min", 0: "tie"}[record.utility]
+
+        report["results"][result] += 1
+
+        for (ply, (game, move)) in enumerate(record.replay()):
+
+            report["moves"] += 1
+            report["columns"][move[1]] += 1
+            report["by_ply"].setdefault(ply, Counter())[move[1]] += 1
+
+            if record.seconds is not None:
+                report["seconds"][ply] = report["seconds"].get(ply, 0.0) + record.seconds[ply]
+
+        if record.start is None and len(record) >= plies:
+
+            opening = tuple(record.moves[:plies])
+            opening = min(opening, tuple(width - 1 - column for column in opening))
+
+            tally = report["openings"].setdefault(opening, Counter())
+            tally["games"] += 1
+            tally[result] += 1
+
+    return report
+
+
+def main(argv):
+
+    """
+    Prints the analysis of a game log
+
+    :param argv: File of the game log, then optionally the plies of an opening
+    """
+
+    plies = int(argv[1]) if len(argv) > 1 else 4
+    report = analyze(read_games(argv[0]), plies)
+
+    games = report["games"]
+    print("games", games, "moves", report["moves"], "results", dict(report["results"]))
+
+    if not games:
+        return
+
+    print("average length", report["moves"] / games)
+    print("columns", dict(sorted(report["columns"].items())))
+
+    openings = sorted(report["openings"].items(), key=lambda item: -item[1]["games"])
+
+    for (opening, tally) in openings[:20]:
+        print(" ".join(map(str, opening)), dict(tally))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,205 @@
+"""
+Headless match runner for engine against engine games. Unlike
+Game.play it shows nothing and never sleeps, plays many games,
+optionally in parallel processes, and yields a record per game.
+"""
+
+import random
+from multiprocessing import Pool
+from time import perf_counter
+from playing.games.connect_four import ConnectFour
+
+
+class Record(object):
+
+    """
+    The result of one game of a match. Players are named "a" and "b"
+    after the two factories given to run_match.
+    """
+
+    __slots__ = ("index", "seed", "max_name", "utility", "winner", "moves", "latencies", "nodes", "stats")
+
+    def __init__(self, index, seed, max_name):
+
+        """
+        :param index: Number of the game in the match
+        :param seed: Seed the game was played with
+        :param max_name: Name of the player that was MAX and moved first
+        """
+
+        self.index = index
+        self.seed = seed
+        self.max_name = max_name
+
+        # utility of the finished game, and the name of the winner or None for a tie
+        self.utility = None
+        self.winner = None
+
+        # column, seconds and searched nodes (None if not reported) of every move
+        self.moves = []
+        self.latencies = []
+        self.nodes = []
+
+        # Stats.as_dict() of every move when the match is instrumented,
+        # None for the moves of players that do not collect them
+        self.stats = []
+
+    def __repr__(self):
+        return "Record(index=%d, max=%s, winner=%s, moves=%d)" % (self.index, self.max_name, self.winner,
+                                                                   len(self.moves))
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+def searched(player):
+
+    """
+    :param player: Player
+    :return: Nodes the player reports as searched so far, None if it does not count them
+    """
+
+    counter = getattr(player, "searched", None)
+
+    return None if counter is None else counter()
+
+
+def play_game(make_a, make_b, index, seed, alternate, instrument=False):
+
+    """
+    Plays one game without any output
+
+    :param make_a: Function returning player "a" given whether it maximizes
+    :param make_b: Function returning player "b" given whether it maximizes
+    :param index: Number of the game in the match
+    :param seed: Seed for the random module during the game
+    :param alternate: True to let "b" move first in every odd game
+    :param instrument: True to collect the search statistics of every move
+    :return: Record of the game
+    """
+
+    random.seed(seed)
+
+    a_maximizes = not (alternate and index % 2 == 1)
+
+    a = make_a(a_maximizes)
+    b = make_b(not a_maximizes)
+
+    # players that came with an opponent of their own (like a minimax
+    # player paired with its search partner) keep it
+    for (player, opponent) in ((a, b), (b, a)):
+        if getattr(player, "opponent", None) is None:
+            player.assume(opponent)
+
+    if instrument:
+        a.instrument()
+        b.instrument()
+
+    record = Record(index, seed, "a" if a_maximizes else "b")
+
+    game = ConnectFour()
+    player, opponent = (a, b) if a_maximizes else (b, a)
+
+    try:
+
+        while game.utility() is None:
+
+            before = searched(player)
+
+            start = perf_counter()
+            move = player.move(game)
+            record.latencies.append(perf_counter() - start)
+
+            after = searched(player)
+            record.nodes.append(None if after is None else after - before)
+
+            record.moves.append(move[1])
+
+            if instrument:
+                record.stats.append(None if player.stats is None else player.stats.as_dict())
+
+            game = game.child(move, player)
+            player, opponent = opponent, player
+
+    finally:
+
+        # shut down any process pools the players started
+        for player in (a, b):
+            if hasattr(player, "close"):
+                player.close()
+
+    record.utility = game.utility()
+
+    if record.utility == 1:
+        record.winner = record.max_name
+    elif record.utility == -1:
+        record.winner = "b" if record.max_name == "a" else "a"
+
+    return record
+
+
+def play_task(task):
+    return play_game(*task)
+
+
+def run_match(make_a, make_b, games, seed=0, alternate=True, workers=None, instrument=False, log=None):
+
+    """
+    Plays a match between two players. The factories are called with
+    whether the player maximizes, once per game, and must be picklable
+    (module level functions or functools.partial of classes) when workers
+    are used. Players that start their own process pools cannot run
+    inside the workers.
+
+    :param make_a: Function returning player "a" given whether it maximizes
+    :param make_b: Function returning player "b" given whether it maximizes
+    :param games: Number of games
+    :param seed: Seed of the first game, game i is played with seed + i
+    :param alternate: True to swap which player moves first every game
+    :param workers: Number of worker processes, None to play in this process
+    :param instrument: True to collect the search statistics of every move in Record.stats
+    :param log: Optional gamelog.GameWriter every game is appended to as it
+    finishes, written from this process
+    :return: Generator of Records, in order of completion when workers are used
+    """
+
+    tasks = [(make_a, make_b, index, seed + index, alternate, instrument) for index in range(games)]
+
+    if workers is None:
+
+        for task in tasks:
+
+            record = play_task(task)
+
+            if log is not None:
+                log.write_record(record)
+
+            yield record
+
+        return
+
+    with Pool(workers) as pool:
+        for record in pool.imap_unordered(play_task, tasks):
+
+            if log is not None:
+                log.write_record(record)
+
+            yield record
+
+
+def summary(records):
+
+    """
+    Tallies the results of a match
+
+    :param records: Iterable of Records
+    :return: Dictionary of wins of "a", wins of "b", ties and games
+    """
+
+    tally = {"a": 0, "b": 0, "tie": 0, "games": 0}
+
+    for record in records:
+        tally["tie" if record.winner is None else record.winner] += 1
+        tally["games"] += 1
+
+    return tally
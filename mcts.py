@@ -0,0 +1,270 @@
+"""
+This class ('mcts') implements monte carlo tree search with
+UCT selection. Unlike the MonteCarlo player, which spends the same
+number of playouts on every move, the tree spends its playouts on the
+moves that look most promising and is kept between turns.
+"""
+
+import random
+from math import log, sqrt
+from time import perf_counter, time
+from playing.utils.framework import Player
+
+
+class Node(object):
+
+    """
+    A game in the search tree together with the
+    statistics of every playout that passed through it
+    """
+
+    __slots__ = ("game", "move", "parent", "player", "children", "untried", "visits", "wins")
+
+    def __init__(self, game, move, parent, player):
+
+        """
+        :param game: Game of this node
+        :param move: Move that led from the parent to this node
+        :param parent: Parent Node, None for the root
+        :param player: Player to move in game
+        """
+
+        self.game = game
+        self.move = move
+        self.parent = parent
+        self.player = player
+        self.children = []
+        self.untried = game.moves() if game.utility() is None else []
+        self.visits = 0
+
+        # playout results for the player who moved into this node,
+        # 1 for a win and 0.5 for a tie
+        self.wins = 0.0
+
+    def select(self, exploration):
+
+        """
+        Picks the child with the highest upper confidence bound (UCB1)
+
+        :param exploration: Weight of the exploration term
+        :return: Child Node to descend into
+        """
+
+        scale = exploration * sqrt(log(self.visits))
+
+        best = None
+        best_bound = -1.0
+
+        for child in self.children:
+
+            bound = child.wins / child.visits + scale / sqrt(child.visits)
+
+            if bound > best_bound:
+                best = child
+                best_bound = bound
+
+        return best
+
+    def expand(self, rng):
+
+        """
+        Adds the child of one untried move
+
+        :param rng: Random number generator picking the move
+        :return: The new child Node
+        """
+
+        move = self.untried.pop(rng.randrange(len(self.untried)))
+
+        child = Node(self.game.child(move, self.player), move, self, self.player.opponent)
+        self.children.append(child)
+
+        return child
+
+
+class MCTS(Player):
+
+    """
+    The MCTS class takes a Player object and searches a tree of games,
+    choosing which move to explore with UCT, finishing each game with a
+    random playout and backing the result up to the root.
+    """
+
+    def __init__(self, maximize, iterations=2000, time_budget=None, exploration=sqrt(2), seed=None):
+
+        """
+        :param maximize: True for MAX, False for MIN
+        :param iterations: Playouts per move, used when there is no time budget
+        :param time_budget: Seconds to search per move, None to use iterations
+        :param exploration: UCT exploration constant
+        :param seed: Seed for the random playouts, None to draw one from the random
+        module, so seeding it (as the match runner does) seeds the playouts too
+        """
+
+        self.maximize = maximize
+        self.opponent = None
+        self.iterations = iterations
+        self.time_budget = time_budget
+        self.exploration = exploration
+        self.rng = random.Random(random.getrandbits(64) if seed is None else seed)
+
+        # tree kept from the last move, rooted at the game after it
+        self.root = None
+
+    def assume(self, opponent):
+
+        """
+        Creates the player and opponent structure
+
+        :param opponent: Another Player object
+        :return: assign opponent as self's opponent
+        """
+
+        self.opponent = opponent
+
+    def maximizes(self):
+
+        """
+        Determines if the player is maximized or not.
+
+        :return: True (MAX) or False (MIN)
+        """
+
+        return self.maximize
+
+    def move(self, game, alpha=None, beta=None):
+
+        """
+        Grows the search tree from game until the iterations or the time
+        budget are spent and plays the most visited move
+
+        :param game: Current layout of the game
+        :param alpha: Unused, part of the Player interface
+        :param beta: Unused, part of the Player interface
+        :return: The move explored most often
+        """
+
+        stats = self.stats
+        if stats is not None:
+            stats.reset()
+            start = perf_counter()
+
+        root = self.reuse(game)
+        visits = root.visits
+
+        if self.time_budget is None:
+
+            for x in range(self.iterations):
+                self.iterate(root)
+
+        else:
+
+            deadline = time() + self.time_budget
+
+            while time() < deadline:
+                self.iterate(root)
+
+        # with no iterations or a budget spent before the first one the
+        # root has no children yet, one iteration expands a legal move
+        if not root.children:
+            self.iterate(root)
+
+        best = max(root.children, key=lambda child: child.visits)
+
+        if stats is not None:
+
+            # every iteration adds one node and plays one game out,
+            # the root kept from the last move counts as a cache hit
+            stats.playouts = stats.nodes = root.visits - visits
+            stats.hits, stats.misses = (0, 1) if visits == 0 else (1, 0)
+            stats.timed("tree", perf_counter() - start)
+
+            node = root
+            while node.children:
+                node = max(node.children, key=lambda child: child.visits)
+                stats.variation.append(node.move)
+
+        # keep the subtree of the move played for the next turn
+        best.parent = None
+        self.root = best
+
+        return best.move
+
+    def reuse(self, game):
+
+        """
+        Finds game among the positions the opponent could reach
+        from the tree kept after the last move
+
+        :param game: Current layout of the game
+        :return: Root Node for this search, a new one if game is not in the tree
+        """
+
+        if self.root is not None:
+
+            for child in self.root.children:
+
+                # equality also matches the mirror image, whose subtree
+                # holds mirrored moves
+                if child.game.key() == game.key():
+                    child.parent = None
+                    return child
+
+        return Node(game, None, None, self)
+
+    def iterate(self, root):
+
+        """
+        Runs one selection, expansion, playout and backpropagation
+
+        :param root: Root Node of the search
+        """
+
+        node = root
+
+        # selection
+        while not node.untried and node.children:
+            node = node.select(self.exploration)
+
+        # expansion
+        if node.untried:
+            node = node.expand(self.rng)
+
+        utility = self.playout(node)
+
+        # backpropagation
+        while node.parent is not None:
+
+            node.visits += 1
+
+            if node.parent.player.maximizes():
+                node.wins += (utility + 1) / 2
+            else:
+                node.wins += (1 - utility) / 2
+
+            node = node.parent
+
+        node.visits += 1
+
+    def playout(self, node):
+
+        """
+        Finishes the game of a node with random moves
+
+        :param node: Node to play out from
+        :return: Utility of the finished game
+        """
+
+        game = node.game
+        player = node.player
+
+        utility = game.utility()
+
+        while utility is None:
+
+            game = game.child(self.rng.choice(game.moves()), player)
+            player = player.opponent
+
+            utility = game.utility()
+
+        return utility
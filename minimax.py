@@ -6,20 +6,276 @@ moves.
 
 from playing.utils.framework import Player
 from math import inf
+from time import perf_counter, time
 
 # Author: Dylan DeChiara
 # Date: 3/11/19
 # Version: 1.0
 
+# bound types of a transposition table entry
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class Entry(object):
+
+    """
+    A single searched position in the TranspositionTable
+    """
+
+    __slots__ = ("game", "value", "bound", "depth", "move", "generation")
+
+    def __init__(self, game, value, bound, depth, move, generation):
+        self.game = game
+        self.value = value
+        self.bound = bound
+        self.depth = depth
+        self.move = move
+        self.generation = generation
+
+
+class TranspositionTable(object):
+
+    """
+    Bounded cache of searched positions keyed on the game hash, so a
+    position reached through a different move order is not searched again.
+    Best moves are stored in the orientation of Game.orient, so a game that
+    equals the stored one as a mirror image must orient them back.
+
+    The table has a fixed number of slots derived from its memory cap. When
+    two positions share a slot, the entry searched deeper is kept, unless it
+    was stored by an older search (see new_search).
+    """
+
+    # rough size in bytes of one entry together with the game it holds
+    ENTRY_SIZE = 512
+
+    def __init__(self, memory=64 * 1024 * 1024):
+
+        """
+        :param memory: Memory cap of the table in bytes
+        """
+
+        self.size = max(1, memory // self.ENTRY_SIZE)
+        self.slots = [None] * self.size
+        self.generation = 0
+
+    def __len__(self):
+        return sum(1 for entry in self.slots if entry is not None)
+
+    def slot(self, game):
+
+        """
+        Spreads game hashes over the slots, hashes with only
+        their low bits differing land in different slots too
+
+        :param game: Game to find a slot for
+        :return: Index into slots
+        """
+
+        return ((hash(game) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF) >> 32) % self.size
+
+    def new_search(self):
+
+        """
+        Marks every stored entry as old, so it gives way to the
+        entries of the next search
+        """
+
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * self.size
+
+    def probe(self, game, depth, alpha, beta):
+
+        """
+        Looks up a position
+
+        :param game: Position being searched
+        :param depth: Remaining depth the search needs
+        :param alpha: Current alpha of the search
+        :param beta: Current beta of the search
+        :return: The stored entry (or None) and whether its value
+        can be returned without searching the position again
+        """
+
+        entry = self.slots[self.slot(game)]
+
+        if entry is None or not entry.game == game:
+            return None, False
+
+        if entry.depth < depth:
+            return entry, False
+
+        if entry.bound == EXACT:
+            return entry, True
+
+        if entry.bound == LOWER:
+            return entry, entry.value >= beta
+
+        return entry, entry.value <= alpha
+
+    def store(self, game, value, bound, depth, move):
+
+        """
+        Stores the result of a search
+
+        :param game: Searched position
+        :param value: Value found for the position
+        :param bound: EXACT, LOWER or UPPER
+        :param depth: Depth the position was searched to
+        :param move: Best move found in the position, stored oriented
+        """
+
+        index = self.slot(game)
+        old = self.slots[index]
+
+        # replace same position, stale or shallower entries
+        if old is None or old.generation != self.generation or depth >= old.depth or old.game == game:
+            self.slots[index] = Entry(game, value, bound, depth, game.orient(move), self.generation)
+
+
+def bound(value, alpha, beta):
+
+    """
+    Determines what a search result says about the true value
+
+    :param value: Value returned by the search
+    :param alpha: Alpha the search was started with
+    :param beta: Beta the search was started with
+    :return: UPPER if the search failed low, LOWER if it failed high,
+    EXACT otherwise
+    """
+
+    if value <= alpha:
+        return UPPER
+
+    if value >= beta:
+        return LOWER
+
+    return EXACT
+
+
+class SearchTimeout(Exception):
+
+    """
+    Raised inside a search once its Budget is spent
+    """
+
+
+class Budget(object):
+
+    """
+    Wall-clock and node limits shared by both players of one search
+    """
+
+    # nodes searched between two looks at the clock
+    CLOCK_INTERVAL = 256
+
+    def __init__(self, seconds=None, nodes=None):
+
+        """
+        :param seconds: Time the search may take, None for no limit
+        :param nodes: Number of nodes the search may visit, None for no limit
+        """
+
+        self.deadline = None if seconds is None else time() + seconds
+        self.limit = nodes
+        self.nodes = 0
+
+        # times the search stopped at its depth limit, a subtree
+        # is solved when this does not change while searching it
+        self.horizons = 0
+
+    def spend(self):
+
+        """
+        Counts a node and raises SearchTimeout once the budget is spent
+        """
+
+        self.nodes += 1
+
+        if self.limit is not None and self.nodes > self.limit:
+            raise SearchTimeout
+
+        if self.deadline is not None and self.nodes % self.CLOCK_INTERVAL == 0 and time() > self.deadline:
+            raise SearchTimeout
+
+
+def no_heuristic(game):
+
+    """
+    Default horizon evaluation, knows nothing about the game
+
+    :param game: Game at the horizon
+    :return: 0
+    """
+
+    return 0
+
+
+# killer moves remembered per ply
+KILLERS = 2
+
+
 class MiniMaxPlayer(Player):
 
     """
     Sub class of the Player superclass that frames the
     desired MiniMax player (either MIN or MAX)
+
+    Without a budget the player searches to the end of the game, or to
+    depth if one is given. With a time or node budget move() deepens the
+    search one ply at a time and plays the best move of the deepest search
+    that finished within the budget.
+
+    Moves are searched in order: the best move stored in the transposition
+    table, the killer moves of the ply (moves that caused a cutoff in a
+    sibling position), then the remaining moves by their history score
+    (how often and how deep they caused cutoffs), center columns first
+    while the scores are tied.
+
+    With a tablebase every position it holds is answered from it
+    instead of being searched.
     """
 
-    def __init__(self):
+    def __init__(self, table=None, depth=None, time_budget=None, node_budget=None, heuristic=no_heuristic,
+                 ordering=True, tablebase=None):
+
+        """
+        :param table: Optional TranspositionTable, usually shared
+        with the opponent
+        :param depth: Maximum search depth in plies, None for no limit
+        :param time_budget: Seconds move() may take, None for no limit
+        :param node_budget: Nodes move() may visit, None for no limit
+        :param heuristic: Function scoring a game at the depth limit, it should
+        return a value strictly between -1 and 1 from MAX's point of view
+        :param ordering: False to search moves in the order game.moves() gives them
+        :param tablebase: Optional Tablebase with the exact values of endgame positions
+        """
+
         self.opponent = None
+        self.table = table
+        self.depth = inf if depth is None else depth
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self.heuristic = heuristic
+        self.budget = None
+        self.ordering = ordering
+        self.tablebase = tablebase
+
+        # move ordering state: killer moves per ply and history scores per move
+        self.killers = dict()
+        self.history = dict()
+
+        # positions searched by this player
+        self.nodes = 0
+
+        # Stats of the move being searched, shared with the opponent like
+        # the budget, None when the search is not instrumented
+        self.recording = None
 
     # assign opponent
     def assume(self, opponent):
@@ -31,12 +287,236 @@ class MiniMaxPlayer(Player):
 
     # determines move
     def move(self, game, alpha=None, beta=None):
-        return self.value(game)[1]
+
+        if self.table is not None:
+            self.table.new_search()
+
+        for player in (self, self.opponent):
+            player.killers.clear()
+            player.history.clear()
+
+        stats = self.stats
+        if stats is not None:
+            stats.reset()
+            nodes = self.searched()
+            start = perf_counter()
+
+        self.recording = self.opponent.recording = stats
+
+        try:
+
+            if self.time_budget is None and self.node_budget is None:
+                move = self.value(game, depth=self.depth)[1]
+            else:
+                move = self.deepen(game)[1]
+
+        finally:
+            self.recording = self.opponent.recording = None
+
+        if stats is not None:
+            stats.timed("search", perf_counter() - start)
+            stats.nodes = self.searched() - nodes
+            stats.variation = self.variation(game, move)
+
+        return move
+
+    def deepen(self, game):
+
+        """
+        Iterative deepening: searches one ply deeper each time
+        until the budget is spent or the game is solved
+
+        :param game: Current game
+        :return: Best value and move of the deepest finished search
+        """
+
+        budget = Budget(self.time_budget, self.node_budget)
+        self.budget = self.opponent.budget = budget
+
+        best = None
+        depth = 1
+
+        try:
+
+            while depth <= self.depth:
+
+                horizons = budget.horizons
+                best = self.value(game, depth=depth)
+
+                # searched to the end of every line or found a forced result
+                if budget.horizons == horizons or abs(best[0]) == 1:
+                    break
+
+                depth += 1
+
+        except SearchTimeout:
+            pass
+
+        finally:
+            self.budget = self.opponent.budget = None
+
+        # not even one ply fitted in the budget
+        if best is None:
+            best = self.heuristic(game), game.moves()[0]
+
+        return best
 
     # determines value for game and move
-    def value(self, game):
+    def value(self, game, alpha=-inf, beta=+inf, depth=inf, ply=0):
         raise NotImplementedError
 
+    def searched(self):
+
+        """
+        :return: Positions searched by this player and its opponent
+        """
+
+        return self.nodes + self.opponent.nodes
+
+    def variation(self, game, move):
+
+        """
+        Follows the best moves stored in the transposition table
+
+        :param game: Game the search started from
+        :param move: Move the search chose in game
+        :return: List of moves from game, starting with move, up to the
+        first position missing from the table or the end of the game
+        """
+
+        line = []
+        player = self
+
+        while move is not None and game.utility() is None:
+
+            line.append(move)
+            game = game.child(move, player)
+            player = player.opponent
+
+            if self.table is None:
+                break
+
+            entry = self.table.probe(game, 0, -inf, +inf)[0]
+            move = None if entry is None else game.orient(entry.move)
+
+        return line
+
+    def order(self, game, ply, entry):
+
+        """
+        Sorts moves so the ones most likely to cause a cutoff come first
+
+        :param game: Game being searched
+        :param ply: Distance of the game from the root of the search
+        :param entry: Transposition table entry of the game or None
+        :return: List of moves in search order
+        """
+
+        if not self.ordering:
+            return game.moves()
+
+        # the sort is stable, so moves that tie stay in the game's preferred order
+        moves = game.moves(ordered=True)
+
+        best = None if entry is None else game.orient(entry.move)
+        killers = self.killers.get(ply, ())
+        history = self.history
+
+        def key(move):
+
+            if move == best:
+                return 0, 0, 0
+
+            if move in killers:
+                return 1, killers.index(move), 0
+
+            return 2, -history.get(move, 0)
+
+        return sorted(moves, key=key)
+
+    def cutoff(self, move, ply, depth):
+
+        """
+        Remembers a move that caused a cutoff
+
+        :param move: Move that caused the cutoff
+        :param ply: Distance of the game from the root of the search
+        :param depth: Remaining depth of the search
+        """
+
+        if self.recording is not None:
+            self.recording.cutoffs += 1
+
+        if not self.ordering:
+            return
+
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS:]
+
+        # deeper cutoffs save more work, a search to the end of the game counts once
+        self.history[move] = self.history.get(move, 0) + (1 if depth == inf else depth * depth)
+
+    def horizon(self, game):
+
+        """
+        Scores a game at the depth limit
+
+        :param game: Game that is not over
+        :return: Heuristic value of the game
+        """
+
+        if self.budget is not None:
+            self.budget.horizons += 1
+
+        return self.heuristic(game)
+
+    def lookup(self, game, depth, alpha, beta):
+
+        """
+        Probes the transposition table
+
+        :param game: Game being searched
+        :param depth: Remaining depth of the search
+        :param alpha: Current alpha
+        :param beta: Current beta
+        :return: The stored entry or None, and whether it settles the search
+        """
+
+        entry, settled = self.table.probe(game, depth, alpha, beta)
+
+        if self.recording is not None:
+            if settled:
+                self.recording.hits += 1
+            else:
+                self.recording.misses += 1
+
+        # the stored value may rest on the heuristic
+        if settled and self.budget is not None and entry.depth != inf:
+            self.budget.horizons += 1
+
+        return entry, settled
+
+    def remember(self, game, value, window, depth, move, horizons):
+
+        """
+        Stores a search result in the transposition table
+
+        :param game: Searched game
+        :param value: Best value found
+        :param window: Alpha and beta the search started with
+        :param depth: Depth the game was searched to
+        :param move: Best move found
+        :param horizons: Budget horizon count when the search started
+        """
+
+        # a subtree searched to the end of every line holds at any depth
+        if self.budget is not None and self.budget.horizons == horizons:
+            depth = inf
+
+        self.table.store(game, value, bound(value, *window), depth, move)
+
 # Minimax framework for MAX player
 class MaxPlayer(MiniMaxPlayer):
 
@@ -44,7 +524,7 @@ class MaxPlayer(MiniMaxPlayer):
         return True
 
     # Return the best value and move for MAX in this game
-    def value(self, game, alpha=-inf, beta=+inf):
+    def value(self, game, alpha=-inf, beta=+inf, depth=inf, ply=0):
 
         """
         Determine best value and move for MAX player
@@ -52,21 +532,49 @@ class MaxPlayer(MiniMaxPlayer):
         :param game: Current game
         :param alpha: generic value for alpha beta pruning
         :param beta: generic value for alpha beta pruning
+        :param depth: remaining plies before the heuristic is used
+        :param ply: plies played since the root of the search
         :return: Best value and move for MAX player
         """
 
+        self.nodes += 1
+
+        budget = self.budget
+        if budget is not None:
+            budget.spend()
+
         # Is the game over?
         utility = game.utility()
         if utility is not None:
             return utility, None
 
+        # Is the result known from the tablebase?
+        if self.tablebase is not None:
+            found = self.tablebase.probe(game)
+            if found is not None:
+                return found
+
+        # Is this the depth limit?
+        if depth <= 0:
+            return self.horizon(game), None
+
+        # Has this position been searched before?
+        entry = None
+        if self.table is not None:
+            entry, settled = self.lookup(game, depth, alpha, beta)
+            if settled:
+                return entry.value, game.orient(entry.move)
+
+        window = alpha, beta
+        horizons = None if budget is None else budget.horizons
+
         # Which move leads to the best outcome?
         best_value = -inf
         best_move = None
 
-        for move in game.moves():
+        for move in self.order(game, ply, entry):
             child = game.child(move, self)
-            value = self.opponent.value(child, alpha, beta)[0]
+            value = self.opponent.value(child, alpha, beta, depth - 1, ply + 1)[0]
 
             # Maximizing
             if best_move is None or value > best_value:
@@ -76,8 +584,12 @@ class MaxPlayer(MiniMaxPlayer):
             # Pruning
             alpha = max(alpha, best_value)
             if beta <= alpha:
+                self.cutoff(move, ply, depth)
                 break
 
+        if self.table is not None:
+            self.remember(game, best_value, window, depth, best_move, horizons)
+
         return best_value, best_move
 
 # Minimax framework for MIN player
@@ -87,7 +599,7 @@ class MinPlayer(MiniMaxPlayer):
         return False
 
     # Return the best value and move for MIN in this game
-    def value(self, game, alpha=-inf, beta=+inf):
+    def value(self, game, alpha=-inf, beta=+inf, depth=inf, ply=0):
 
         """
         Determine best value and move for MIN player
@@ -95,21 +607,49 @@ class MinPlayer(MiniMaxPlayer):
         :param game: Current game
         :param alpha: generic value for alpha beta pruning
         :param beta: generic value for alpha beta pruning
+        :param depth: remaining plies before the heuristic is used
+        :param ply: plies played since the root of the search
         :return: Best value and move for MIN player
         """
 
+        self.nodes += 1
+
+        budget = self.budget
+        if budget is not None:
+            budget.spend()
+
         # Is the game over?
         utility = game.utility()
         if utility is not None:
             return utility, None
 
+        # Is the result known from the tablebase?
+        if self.tablebase is not None:
+            found = self.tablebase.probe(game)
+            if found is not None:
+                return found
+
+        # Is this the depth limit?
+        if depth <= 0:
+            return self.horizon(game), None
+
+        # Has this position been searched before?
+        entry = None
+        if self.table is not None:
+            entry, settled = self.lookup(game, depth, alpha, beta)
+            if settled:
+                return entry.value, game.orient(entry.move)
+
+        window = alpha, beta
+        horizons = None if budget is None else budget.horizons
+
         # Which move leads to the best outcome?
         best_value = +inf
         best_move = None
 
-        for move in game.moves():
+        for move in self.order(game, ply, entry):
             child = game.child(move, self)
-            value = self.opponent.value(child, alpha, beta)[0]
+            value = self.opponent.value(child, alpha, beta, depth - 1, ply + 1)[0]
 
             # Minimizing
             if best_move is None or value < best_value:
@@ -119,6 +659,34 @@ class MinPlayer(MiniMaxPlayer):
             # Pruning
             beta = min(beta, best_value)
             if beta <= alpha:
+                self.cutoff(move, ply, depth)
                 break
 
+        if self.table is not None:
+            self.remember(game, best_value, window, depth, best_move, horizons)
+
         return best_value, best_move
+
+
+def searcher(maximize, memory=64 * 1024 * 1024, **options):
+
+    """
+    Builds a MAX or MIN player already paired with its search partner
+    and a shared transposition table, for playing against other kinds
+    of players
+
+    :param maximize: True for a MaxPlayer, False for a MinPlayer
+    :param memory: Memory cap of the transposition table in bytes
+    :param options: Further MiniMaxPlayer options, given to both players
+    :return: The MaxPlayer or MinPlayer
+    """
+
+    table = TranspositionTable(memory)
+
+    max_player = MaxPlayer(table, **options)
+    min_player = MinPlayer(table, **options)
+
+    max_player.assume(min_player)
+    min_player.assume(max_player)
+
+    return max_player if maximize else min_player
@@ -4,16 +4,19 @@ of the commonly known monte carlo tree search algorithm.
 """
 
 import random
+from math import inf, sqrt
+from multiprocessing import Pool
+from statistics import NormalDist
+from time import perf_counter
 from playing.utils.framework import Player
-from playing.players.minimax import MinPlayer, MaxPlayer
+from playing.players.minimax import searcher
+from playing.games.rollout import Rollout, winning_cells
+from playing.games.evaluation import evaluate_masks
 
 # Author: Dylan DeChiara
 # Date: 3/11/19
 # Version: 1.0
 
-HEIGHT = 6
-WIDTH = 7
-
 class MonteCarlo(Player):
 
 
@@ -22,11 +25,120 @@ class MonteCarlo(Player):
     all the required methods to determine the best move based on
     a calculated score create through x iterations of completed
     games that are generated.
+
+    With workers set, the playouts run on a process pool that is kept
+    between moves. A round then gives every move more playouts, enough
+    for a task of about sample playouts per worker, and the playouts of a
+    move are only split over several tasks when there are fewer moves than
+    workers. With the "numpy" backend the playouts of every move run as one
+    NumPy batch.
+
+    Moves are sampled in rounds. After every round the moves whose average
+    score is, at the given confidence, below that of the best move are
+    dropped, and sampling stops once a single move is left or every move
+    has had its iterations. A move that wins at once, or blocks the only
+    cell the opponent would win with, is played without any playouts.
+
+    With a cutoff the playouts stop after that many random moves and the
+    position they reached is scored by the static evaluation instead.
+
+    Once few enough cells are empty the player stops sampling and plays the
+    move of an exact minimax search instead. The searching player and its
+    transposition table are kept between moves, so every later search
+    starts with the positions the earlier ones solved.
+
+    With a tablebase the best move of every position it holds is read
+    from it, and the exact search probes it too.
+
+    With a cache the outcomes of the playouts of every move are kept by
+    the position the move leads to, and a later move that meets the
+    position again, in this game or another, starts from them. Moves
+    that already had their iterations are not played out again.
+
+    With a time budget no new round is started once the budget is spent,
+    the best move so far is played, and the exact search deepens
+    iteratively until the budget runs out.
     """
 
-    def __init__(self, maximize):
+    def __init__(self, maximize, workers=None, seed=None, backend=None, exact=18, memory=64 * 1024 * 1024,
+                 iterations=300, confidence=0.95, sample=30, cutoff=None, tablebase=None, cache=None,
+                 time_budget=None):
+
+        """
+        :param maximize: True for MAX, False for MIN
+        :param workers: Number of worker processes, None to run playouts in this process
+        :param seed: Seed for the worker and NumPy batches, None to draw one from
+        the random module, so seeding it (as the match runner does) seeds them too
+        :param backend: "numpy" to run playouts in batches on NumPy, None
+        for one playout at a time
+        :param exact: Number of empty cells from which on moves are found by
+        exact search instead of playouts, 0 to never search
+        :param memory: Memory cap in bytes of the transposition table of the exact search
+        :param iterations: Most playouts per move
+        :param confidence: Confidence with which a dropped move is worse than the
+        best one, None to give every move all of its iterations in one round
+        :param sample: Playouts per move and round
+        :param cutoff: Random moves after which a playout is scored by
+        evaluation.evaluate_masks, None to play every game to the end
+        :param tablebase: Optional Tablebase with the exact values of endgame positions
+        :param cache: Optional PositionCache of playout outcomes, usually shared
+        by the players of a process
+        :param time_budget: Seconds a move may take, None for no limit
+        """
+
         self.maximize = maximize
         self.opponent = None
+        self.workers = workers
+        self.rng = random.Random(random.getrandbits(64) if seed is None else seed)
+        self.pool = None
+        self.exact = exact
+        self.memory = memory
+        self.iterations = iterations
+        self.confidence = confidence
+        self.sample = sample
+        self.cutoff = cutoff
+        self.tablebase = tablebase
+        self.cache = cache
+        self.time_budget = time_budget
+
+        # minimax player for this side, made on the first exact search
+        self.solver = None
+
+        # mutable board the playouts are run on
+        self.kernel = Rollout(cutoff=cutoff, evaluate=evaluate_masks)
+
+        self.batch = None
+        if backend == "numpy":
+
+            if cutoff is not None:
+                raise ValueError("the numpy backend plays every game to the end")
+
+            # NumPy is only needed for this backend
+            from playing.games.batch import BatchRollout
+            self.batch = BatchRollout(self.rng.getrandbits(32))
+
+        elif backend is not None:
+            raise ValueError("unknown playout backend " + repr(backend))
+
+    def __getstate__(self):
+
+        # a process pool cannot be pickled, a copy starts its own,
+        # and its own transposition table too rather than copying this one
+        state = self.__dict__.copy()
+        state["pool"] = None
+        state["solver"] = None
+        return state
+
+    def close(self):
+
+        """
+        Shuts down the worker processes, if any
+        """
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
 
     def assume(self, opponent):
 
@@ -54,221 +166,374 @@ class MonteCarlo(Player):
     def score(self, move, game):
 
         """
-        Takes a move and the current game (board) and finishes the game by creating a
-        dictionary of children and their respective utilities. Organizing moves based on
-        whether or not they win, lose, tie, or do nothing.
+        Takes a move and the current game (board) and finishes the game on the
+        rollout kernel. At every turn a player takes a winning move if it has
+        one, otherwise a random move, which orders moves by whether they win,
+        tie, do nothing or lose just like building every child would.
 
         :param move: Tuple location of specific move in current game (board)
         :param game: Current orientation of the game
         :return: 1 if the game resulted in a win for MAX or MIN, -1 if the game resulted
-        in a loss of MAX or MIN, and 0 if the game resulted in a tie. Also returns board size
-        which is needed so we know when the board is small enough to enable Minimax protocol
+        in a loss of MAX or MIN, and 0 if the game resulted in a tie. Also returns the number
+        of empty cells above the bottom row after the move
         """
 
-        board_size = 0
+        return self.kernel.score(game, move, self.maximize)
 
-        game = game.child(move, self)
+    def playouts(self, moves, game, iterations):
 
-        p = self.opponent
-
-        # get size of game
-        for row in range(HEIGHT):
-            for col in range(WIDTH):
+        """
+        Plays out every move iterations times, in this process or
+        spread over the worker pool
 
-                if game.board[row][col] == 0:
-                    board_size += 1
+        :param moves: Moves to play out
+        :param game: Current orientation of the game
+        :param iterations: Playouts per move
+        :return: List with the total score, the total board size and the
+        total wins and losses of each move
+        """
 
-        # while game is not finished
-        while game.utility() is None:
+        if self.batch is not None:
+            return [self.batch.score(game, move, self.maximize, iterations) for move in moves]
 
-            moves = game.moves()
+        if self.workers is None:
 
-            # dictionaries
-            child_dict = dict()
-            utility_dict = dict()
-            winning_dict = dict()
-            tie_dict = dict()
-            open_board_dict = dict()
-            losing_dict = dict()
+            results = []
 
-            # create a key, value pair for each move and it's child
             for move in moves:
 
-                child_dict[move] = game.child(move, p)
+                game_size_total = 0
 
-            # create a key, value pair for each move and it's utility
-            for move, child in child_dict.items():
+                total = 0
+                wins = 0
+                losses = 0
 
-                utility_dict[move] = child.utility()
+                for x in range(iterations):
 
-            # key: move value: utility
-            # organize moves based on utilities
-            for move, utility in utility_dict.items():
+                    # 1 0 -1
+                    scr, game_size = self.score(move, game)
 
-                # Check if p.maximize to see if 1 is a winning utility.
+                    total += scr
 
-                if p.maximize is True and utility == 1:
+                    if scr > 0:
+                        wins += scr
+                    elif scr < 0:
+                        losses -= scr
 
-                    winning_dict[move] = utility
+                    game_size_total += game_size
 
-                elif p.maximize is False and utility == -1:
+                results.append((total, game_size_total, wins, losses))
 
-                    winning_dict[move] = utility
+            return results
 
-                elif p.maximize is True and utility == -1:
+        if self.pool is None:
+            self.pool = Pool(self.workers)
 
-                    losing_dict[move] = utility
+        # root parallelization: the playouts of a move are split into shares
+        # when there are workers to spare, but no share is much smaller than
+        # sample, so a task is never just a pickled game and a playout or two
+        shares = max(1, min(self.workers // len(moves), iterations // self.sample))
 
-                elif p.maximize is False and utility == 1:
+        tasks = []
+        for move in moves:
+            for worker in range(shares):
 
-                    losing_dict[move] = utility
+                share = iterations // shares + (worker < iterations % shares)
+                tasks.append((self.maximize, game, move, share, self.rng.getrandbits(32), self.cutoff))
 
-                elif utility == 0:
+        batches = self.pool.map(playout_batch, tasks)
 
-                    tie_dict[move] = utility
+        results = []
+        for index in range(len(moves)):
 
-                elif utility is None:
+            merged = batches[index * shares:(index + 1) * shares]
+            results.append(tuple(sum(column) for column in zip(*merged)))
 
-                    open_board_dict[move] = utility
+        return results
 
+    def move(self, game, alpha=None, beta=None):
 
-            # empty dict eval to false bool(dict)
-            # check dictionaries for possible moves
+        """
+        Determine the right move to makes by simulating x ('iterations) of
+        fully played out games for each possible move per player. The goal
+        here is to create a score for each move that is possible, where the higher
+        the score the better the move will be in terms of winning the game.
+
+        When no more than exact cells are empty the game is searched to the
+        end with minimax instead and its best move is played.
 
-            # list of children with winning utility
-            if bool(winning_dict):
+        :param game: Current layout of the game
+        :param alpha: Conditional args for alpha beta pruning (minimax)
+        :param beta: Conditional args for alpha beta pruning (minimax)
+        :return: The best possible move based on the score for each move possible
+        """
 
-                m = random.choice(list(winning_dict))
+        stats = self.stats
+        if stats is not None:
+            stats.reset()
 
-            else:
+        if self.time_budget is not None:
+            deadline = perf_counter() + self.time_budget
 
-                # ties
-                if bool(tie_dict):
+        # solved before the game was even played
+        if self.tablebase is not None:
 
-                    m = random.choice(list(tie_dict))
+            found = self.tablebase.probe(game)
 
+            if stats is not None:
+                if found is None:
+                    stats.misses = 1
                 else:
+                    stats.hits = 1
+                    stats.variation = [found[1]]
+
+            if found is not None:
+                return found[1]
 
-                    # simply open board moves (no tie, loss, or win
-                    if bool(open_board_dict):
+        # small enough for minimax alpha beta pruning
+        if game.geometry.cells - game.count <= self.exact:
+            return self.solve(game)
 
-                        m = random.choice(list(open_board_dict))
+        moves = game.moves()
+
+        # a win or a forced block needs no playouts
+        ret_move = self.tactical(game, moves)
+        if ret_move is not None:
+            if stats is not None:
+                stats.variation = [ret_move]
+            return ret_move
+
+        if stats is not None:
+            start = perf_counter()
+
+        iterations = self.iterations
+
+        # playouts and total score of every move so far, from the cache
+        # when the positions they lead to were sampled before
+        visits = [0] * len(moves)
+        totals = [0] * len(moves)
+
+        keys = None
+        cache = self.cache
 
+        if cache is not None and cache.geometry is game.geometry:
+
+            keys = [game.child(move, self).canonical_key() for move in moves]
+
+            for (index, key) in enumerate(keys):
+
+                entry = cache.get(key)
+
+                if stats is not None:
+                    if entry is None:
+                        stats.misses += 1
                     else:
+                        stats.hits += 1
 
-                        # only possible move left
-                        m = random.choice(list(losing_dict))
+                if entry is not None:
+                    visits[index] = entry[0]
+                    totals[index] = entry[1] - entry[3]
 
+        if self.confidence is None:
+            batch = iterations
+            spread = None
+        else:
+            batch = min(self.sample, iterations)
 
-            game = game.child(m, p)
+            # standard deviations the best move may fall behind, the
+            # risk of dropping it is shared out over the other moves
+            spread = NormalDist().inv_cdf(1 - (1 - self.confidence) / len(moves))
 
-            # change p to simulate a back and forth between players
-            if p is self:
-                p = self.opponent
-            else:
-                p = self
+        # indices of the moves still sampled
+        alive = list(range(len(moves)))
 
-        # check wins
-        if self.maximize is True and game.utility() == 1:
-            return 1, board_size
+        if spread is not None and all(visits):
+            alive = self.eliminate(alive, totals, visits, spread)
 
-        elif self.maximize is False and game.utility() == -1:
-            return 1, board_size
+        # go through each move of possible
+        # moves and randomly make moves
+        # till the game ends
+        while len(alive) > 1:
 
-        # check ties
-        elif game.utility() == 0:
-            return 0, board_size
+            # a round on the pool gives every worker about sample playouts
+            limit = batch
+            if self.workers is not None:
+                limit *= max(1, self.workers // len(alive))
 
-        # check loses
-        elif self.maximize is True and game.utility() == -1:
-            return -1, board_size
+            # the moves short of their iterations, by the playouts they get this round
+            rounds = dict()
+            for index in alive:
+                if visits[index] < iterations:
+                    rounds.setdefault(min(limit, iterations - visits[index]), []).append(index)
 
-        elif self.maximize is False and game.utility() == 1:
-            return -1, board_size
+            if not rounds:
+                break
 
+            if self.time_budget is not None and perf_counter() >= deadline:
+                break
 
-    def move(self, game, alpha=None, beta=None):
+            for (size, indices) in rounds.items():
+
+                results = self.playouts([moves[index] for index in indices], game, size)
+
+                for index, (total, game_size_total, wins, losses) in zip(indices, results):
+
+                    totals[index] += total
+                    visits[index] += size
+
+                    if keys is not None:
+                        cache.add(keys[index], size, wins, size - wins - losses, losses)
+
+                if stats is not None:
+                    stats.playouts += size * len(indices)
+
+            if spread is not None:
+                alive = self.eliminate(alive, totals, visits, spread)
+
+        score = -inf
+
+        ret_move = None
+
+        for index in alive:
+
+            # check outputs to see if calculations and move aquistion is correct
+            #print("score: ", score, "total: ", totals[index], "move: ", moves[index])
+
+            # larger average score is better
+            average = totals[index] / visits[index] if visits[index] else 0
+
+            # replace score with the average if it is higher
+            if average >= score:
+
+                score = average
+                ret_move = moves[index]
+
+        if stats is not None:
+            stats.timed("playouts", perf_counter() - start)
+            stats.variation = [ret_move]
+
+        # best move to return
+        return ret_move
+
+    def tactical(self, game, moves):
 
         """
-        Determine the right move to makes by simulating x ('iterations) of
-        fully played out games for each possible move per player. The goal
-        here is to create a score for each move that is possible, where the higher
-        the score the better the move will be in terms of winning the game.
+        Finds a move that has to be played whatever the playouts say
 
         :param game: Current layout of the game
-        :param alpha: Conditional args for alpha beta pruning (minimax)
-        :param beta: Conditional args for alpha beta pruning (minimax)
-        :return: The best possible move based on the score for each move possible
+        :param moves: Legal moves of the game
+        :return: A move that wins at once, else the move into the cell the
+        opponent would win with next, else None. With two or more such cells
+        the opponent cannot be stopped and the playouts pick the move.
         """
 
-        moves = game.moves()
+        if self.maximize:
+            (mine, theirs) = (game.max_mask, game.min_mask)
+        else:
+            (mine, theirs) = (game.min_mask, game.max_mask)
 
-        iterations = 300
+        tables = game.geometry
+        taken = mine | theirs
+        playable = (taken + tables.bottom) & tables.full
 
-        score = -iterations
+        def cell(move):
+            return 1 << (move[1] * tables.column + tables.height - 1 - move[0])
 
-        ret_move = None
+        wins = winning_cells(mine, taken, tables) & playable
+        if wins:
+            return next(move for move in moves if cell(move) & wins)
 
-        # go through each move of possible
-        # moves and randomly make moves
-        # till the game ends
-        for move in moves:
+        threats = winning_cells(theirs, taken, tables) & playable
+        if threats and threats & (threats - 1) == 0:
+            return next(move for move in moves if cell(move) & threats)
+
+        return None
+
+    def eliminate(self, alive, totals, visits, spread):
 
-            game_size_total = 0
+        """
+        Drops the moves that are worse than the best one beyond doubt. A
+        playout scores -1, 0 or 1, so its variance is at most 1 and the
+        difference of the averages of two moves over m and n playouts has
+        a standard deviation of at most sqrt(1 / m + 1 / n), sqrt(2 / n)
+        when both had the same number.
+
+        :param alive: Indices of the moves still sampled
+        :param totals: Total score of every move
+        :param visits: Playouts every move had
+        :param spread: Number of standard deviations a move may trail the best one by
+        :return: Indices of the moves that may still be the best
+        """
+
+        best = max(alive, key=lambda index: totals[index] / visits[index])
+        average = totals[best] / visits[best]
 
-            total = 0
+        return [index for index in alive
+                if totals[index] / visits[index] + spread * sqrt(1 / visits[index] + 1 / visits[best]) >= average]
+
+    def solve(self, game):
+
+        """
+        Searches game to the end with minimax
 
-            for x in range(iterations):
+        :param game: Current layout of the game
+        :return: The best move of the game
+        """
 
-                # 1 0 -1
-                scr, game_size = self.score(move, game)
+        if self.solver is None:
+            self.solver = searcher(self.maximize, self.memory, tablebase=self.tablebase,
+                                   time_budget=self.time_budget)
 
-                total += scr
+        # the search is instrumented exactly when this player is
+        searched = self.solver.instrument(self.stats is not None)
 
-                game_size_total += game_size
+        move = self.solver.move(game)
 
-            # average size of game from current state
-            avg_game_size = game_size_total / iterations
+        if searched is not None:
+            self.stats.merge(searched)
+            self.stats.variation = list(searched.variation)
 
+        return move
 
-            #check if avg game size is <= 18
-            #if player iS MINI and board is small enough for minimax alpha beta pruning
-            if avg_game_size <= 18 and self.maximize is False:
 
-                min_player = MinPlayer()
-                max_player = MaxPlayer()
+def playout_batch(task):
 
-                min_player.assume(max_player)
-                max_player.assume(min_player)
+    """
+    Runs a batch of playouts in a worker process
 
-                value, ret_move = min_player.value(game)
+    :param task: Tuple of whether the moving player maximizes, the game, the move
+    to play out, the number of playouts, the seed of the batch and the cutoff
+    :return: Total score, total board size, total wins and total losses of the batch
+    """
 
-            #check if avg game size is <= 18
-            # if player iS MAX and board is small enough for minimax alpha beta pruning
-            elif avg_game_size <= 18 and self.maximize is True:
+    (maximize, game, move, iterations, seed, cutoff) = task
 
-                min_player = MinPlayer()
-                max_player = MaxPlayer()
+    random.seed(seed)
 
-                min_player.assume(max_player)
-                max_player.assume(min_player)
+    player = MonteCarlo(maximize, cutoff=cutoff)
+    opponent = MonteCarlo(not maximize, cutoff=cutoff)
 
-                value, ret_move = max_player.value(game)
+    player.assume(opponent)
+    opponent.assume(player)
 
+    game_size_total = 0
 
-            # check outputs to see if calculations and move aquistion is correct
-            #print("score: ", score, "total: ", total, "move: ", move)
+    total = 0
+    wins = 0
+    losses = 0
 
-            # larger score is better
+    for x in range(iterations):
 
-            # replace score with total if total is higher
-            if total >= score:
+        # 1 0 -1
+        scr, game_size = player.score(move, game)
 
-                score = total
-                ret_move = move
+        total += scr
 
+        if scr > 0:
+            wins += scr
+        elif scr < 0:
+            losses -= scr
 
-        # print(ret_move, total)
+        game_size_total += game_size
 
-        # best move to return
-        return ret_move
\ No newline at end of file
+    return total, game_size_total, wins, losses
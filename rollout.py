@@ -0,0 +1,232 @@
+"""
+Playout kernel for connect four. It plays random games on one
+mutable pair of bitboards, loading the position again before every
+playout, so a playout creates no boards, children or move lists
+along the way.
+"""
+
+import random
+from playing.games.connect_four import STANDARD
+
+
+def winning_cells(mask, taken, tables=STANDARD):
+
+    """
+    Finds every empty cell that would complete a line of four for mask
+
+    :param mask: Bitboard of the player
+    :param taken: Bitboard of every piece on the board
+    :param tables: Geometry of the board
+    :return: Bitboard of the empty cells that win for the player
+    """
+
+    column = tables.column
+
+    # vertical
+    cells = (mask << 1) & (mask << 2) & (mask << 3)
+
+    # horizontal and both diagonals, with the empty cell at any of the four places
+    for shift in (column, column - 1, column + 1):
+
+        pairs = (mask << shift) & (mask << 2 * shift)
+        cells |= pairs & (mask << 3 * shift)
+        cells |= pairs & (mask >> shift)
+
+        pairs = (mask >> shift) & (mask >> 2 * shift)
+        cells |= pairs & (mask << shift)
+        cells |= pairs & (mask >> 3 * shift)
+
+    return cells & (tables.full ^ taken)
+
+
+class Rollout(object):
+
+    """
+    A mutable board for playouts. masks[0] holds MAX's pieces and masks[1]
+    MIN's, and open lists the columns that are not full in its first
+    free places. The board takes the size of the last game loaded.
+    """
+
+    __slots__ = ("masks", "taken", "heights", "count", "open", "free", "rng", "cutoff", "evaluate", "tables")
+
+    def __init__(self, rng=None, cutoff=None, evaluate=None):
+
+        """
+        :param rng: random.Random to draw moves from, None for the random module
+        :param cutoff: Number of random moves after which a playout stops and
+        the position is scored by evaluate, None to play every game to the end
+        :param evaluate: Function of the MAX and MIN bitboards, the number of
+        pieces and the Geometry, returning a value for MAX between -1 and 1
+        """
+
+        self.tables = STANDARD
+        self.masks = [0, 0]
+        self.taken = 0
+        self.heights = [0] * STANDARD.width
+        self.count = 0
+        self.open = list(range(STANDARD.width))
+        self.free = STANDARD.width
+        self.rng = rng
+        self.cutoff = cutoff
+        self.evaluate = evaluate
+
+    def load(self, game):
+
+        """
+        Copies a game onto this board
+
+        :param game: ConnectFour game
+        """
+
+        tables = game.geometry
+
+        if tables is not self.tables:
+            self.tables = tables
+            self.heights = [0] * tables.width
+            self.open = list(range(tables.width))
+
+        self.masks[0] = game.max_mask
+        self.masks[1] = game.min_mask
+        self.taken = game.max_mask | game.min_mask
+        self.count = game.count
+
+        self.free = 0
+        for col in range(tables.width):
+
+            height = ((self.taken >> (col * tables.column)) & tables.column_cells).bit_length()
+            self.heights[col] = height
+
+            if height < tables.height:
+                self.open[self.free] = col
+                self.free += 1
+
+    def make(self, col, side):
+
+        """
+        Drops a piece into a column
+
+        :param col: Column of the move
+        :param side: 0 for MAX, 1 for MIN
+        :return: Index of the bit that was set
+        """
+
+        last = col * self.tables.column + self.heights[col]
+        bit = 1 << last
+
+        self.masks[side] |= bit
+        self.taken |= bit
+        self.heights[col] += 1
+        self.count += 1
+
+        # swap a full column out of the open ones
+        if self.heights[col] == self.tables.height:
+            index = self.open.index(col, 0, self.free)
+            self.free -= 1
+            self.open[index] = self.open[self.free]
+            self.open[self.free] = col
+
+        return last
+
+    def won(self, last, side):
+
+        """
+        Checks the lines through the last move
+
+        :param last: Bit index of the last move
+        :param side: Side that made the move
+        :return: True if the move completed a line of four
+        """
+
+        mask = self.masks[side]
+
+        for line in self.tables.cell_lines[last]:
+            if mask & line == line:
+                return True
+
+        return False
+
+    def empty(self):
+
+        """
+        Counts the empty cells the way the list layout shows them, as 0
+        (an empty bottom cell shows as 9 and is not counted)
+
+        :return: Number of empty cells above the bottom row
+        """
+
+        size = self.tables.cells - self.count
+
+        for col in range(self.tables.width):
+            if self.heights[col] == 0:
+                size -= 1
+
+        return size
+
+    def play(self, side):
+
+        """
+        Plays the board out. Every move wins if it can, otherwise it is a
+        random column. This is the rollout policy of MonteCarlo.score
+        (win > tie > open > losing): a tie is only possible with one empty
+        cell left, and dropping a piece can never complete the opponent's line.
+
+        With a cutoff the game stops after that many random moves instead and
+        is scored by evaluate.
+
+        :param side: Side to move
+        :return: 1 if MAX won, -1 if MIN won, 0 for a tie, or the evaluation
+        """
+
+        rng = random if self.rng is None else self.rng
+        tables = self.tables
+        cells = tables.cells
+
+        # number of pieces at which the playout stops
+        stop = cells - 1
+        if self.cutoff is not None:
+            stop = min(stop, self.count + self.cutoff)
+
+        while True:
+
+            # any winning cell that is the lowest empty cell of its column
+            playable = (self.taken + tables.bottom) & tables.full
+
+            if winning_cells(self.masks[side], self.taken, tables) & playable:
+                return 1 if side == 0 else -1
+
+            if self.count >= stop:
+                if self.count == cells - 1:
+                    return 0
+                return self.evaluate(self.masks[0], self.masks[1], self.count, tables)
+
+            self.make(self.open[rng.randrange(self.free)], side)
+            side ^= 1
+
+    def score(self, game, move, maximize):
+
+        """
+        Plays move in game and finishes the game, or plays it up to the cutoff
+
+        :param game: ConnectFour game
+        :param move: (row, col) move of the player
+        :param maximize: True if the moving player is MAX
+        :return: 1 for a win of the moving player, -1 for a loss and 0 for a tie
+        (or the evaluation at the cutoff for the moving player), and the number
+        of empty cells after move as counted by empty()
+        """
+
+        self.load(game)
+
+        side = 0 if maximize else 1
+        last = self.make(move[1], side)
+
+        board_size = self.empty()
+
+        if self.won(last, side):
+            utility = 1 if side == 0 else -1
+        elif self.count == self.tables.cells:
+            utility = 0
+        else:
+            utility = self.play(side ^ 1)
+
+        return (utility if maximize else -utility), board_size
@@ -0,0 +1,666 @@
+"""
+Game server for many concurrent human against engine games. Clients
+speak a line based JSON protocol over a TCP socket or stdio, every
+request is a JSON object on one line and gets one JSON object back:
+
+    {"id": 1, "op": "new", "player": "minimax", "human": "max", "budget": 1.0}
+    {"id": 2, "op": "move", "session": 1, "column": 3}
+    {"id": 3, "op": "state", "session": 1}
+    {"id": 4, "op": "close", "session": 1}
+    {"id": 5, "op": "stats"}
+
+Responses carry the id of their request and "ok", with "error" when the
+request failed. Engine moves run in a process pool, so a slow search only
+holds up its own session. Backpressure comes from two limits: a connection
+stops reading requests while max_inflight of its requests are unanswered,
+and at most max_pending engine moves are queued on the pool at a time.
+
+    python -m playing.utils.server 8765             serve on a port
+    python -m playing.utils.server stdio            serve on stdin and stdout
+    python -m playing.utils.server client 1000 8765 play 1000 random games
+"""
+
+import asyncio
+import json
+import random
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+from time import perf_counter
+from playing.games.connect_four import ConnectFour
+from playing.games.evaluation import evaluate
+from playing.players.cache import PositionCache
+from playing.players.mcts import MCTS
+from playing.players.minimax import searcher
+from playing.players.montecarlo import MonteCarlo
+from playing.utils.framework import Seat
+
+
+def random_player(maximize, budget):
+    return None
+
+
+def minimax_player(maximize, budget):
+    return searcher(maximize, 16 * 1024 * 1024, time_budget=budget, heuristic=evaluate)
+
+
+# playout outcomes of the MonteCarlo moves of this process, so common
+# positions are answered from the games played before
+CACHE = PositionCache(256 * 1024)
+
+
+def montecarlo_player(maximize, budget):
+
+    player = MonteCarlo(maximize, memory=16 * 1024 * 1024, cache=CACHE, time_budget=budget)
+    player.assume(MonteCarlo(not maximize))
+
+    return player
+
+
+def mcts_player(maximize, budget):
+
+    player = MCTS(maximize, time_budget=budget)
+    opponent = MCTS(not maximize)
+
+    player.assume(opponent)
+    opponent.assume(player)
+
+    return player
+
+
+# engines a session can play against, by name: functions of whether the
+# engine maximizes and its seconds per move, returning a paired Player
+# (None plays random columns, for load tests)
+PLAYERS = {
+    "random": random_player,
+    "minimax": minimax_player,
+    "montecarlo": montecarlo_player,
+    "mcts": mcts_player,
+}
+
+
+# engines of the sessions this worker process moved for last, by session
+# key, so an MCTS engine keeps its tree and a minimax engine its
+# transposition table from one move of a session to the next
+ENGINES = OrderedDict()
+
+# most engines kept by a worker process, each can hold a 16 MB table
+KEPT = 8
+
+# keys of the sessions, unique in the server process and its workers
+KEYS = count()
+
+
+def think(key, kind, maximize, game, budget, seed):
+
+    """
+    Finds an engine move, run in a worker process. The engine of the
+    session is reused when this process made its last move and is still
+    holding it, a new one is built otherwise.
+
+    :param key: Key of the session
+    :param kind: Name of the engine in PLAYERS
+    :param maximize: True if the engine is MAX
+    :param game: ConnectFour game with the engine to move
+    :param budget: Seconds the engine may take
+    :param seed: Seed for the random module
+    :return: Column of the move
+    """
+
+    random.seed(seed)
+
+    # taken out while it searches, a late search of the session that is
+    # still running elsewhere never shares it
+    player = ENGINES.pop(key, None)
+    if player is None:
+        player = PLAYERS[kind](maximize, budget)
+
+    if player is None:
+        return random.choice(game.columns())
+
+    column = player.move(game)[1]
+
+    ENGINES[key] = player
+    if len(ENGINES) > KEPT:
+        ENGINES.popitem(last=False)
+
+    return column
+
+
+class ProtocolError(Exception):
+
+    """
+    Raised for a request the server cannot carry out, its
+    message is sent back to the client
+    """
+
+
+class Session(object):
+
+    """
+    One game between a client and an engine
+    """
+
+    __slots__ = ("id", "key", "game", "kind", "budget", "human", "engine", "rng", "lock")
+
+    def __init__(self, id, kind, human_maximizes, budget, seed):
+
+        """
+        :param id: Number of the session
+        :param kind: Name of the engine in PLAYERS
+        :param human_maximizes: True if the client plays MAX and moves first
+        :param budget: Seconds the engine may take per move
+        :param seed: Seed of the engine moves
+        """
+
+        self.id = id
+        self.key = next(KEYS)
+        self.game = ConnectFour()
+        self.kind = kind
+        self.budget = budget
+        self.human = Seat(human_maximizes)
+        self.engine = Seat(not human_maximizes)
+        self.rng = random.Random(seed)
+
+        # one move at a time per session
+        self.lock = asyncio.Lock()
+
+    def to_move(self):
+
+        """
+        :return: Seat of the player to move, MAX moves after an even number of pieces
+        """
+
+        return self.human if self.human.maximize == (self.game.count % 2 == 0) else self.engine
+
+    def state(self):
+
+        utility = self.game.utility()
+
+        return {
+            "session": self.id,
+            "board": self.game.board,
+            "columns": [] if utility is not None else self.game.columns(),
+            "utility": utility,
+            "human": "max" if self.human.maximize else "min",
+        }
+
+
+class GameServer(object):
+
+    """
+    Holds the sessions of every connection and runs their engine moves
+    """
+
+    def __init__(self, workers=None, executor=None, max_sessions=100000, max_pending=None, max_inflight=1024,
+                 budget=1.0, max_budget=10.0, grace=1.0, seed=None):
+
+        """
+        :param workers: Number of worker processes, None for one per CPU
+        :param executor: concurrent.futures executor to run engine moves on instead of a new process pool
+        :param max_sessions: Most sessions held at a time
+        :param max_pending: Most engine moves queued on the executor, None for four per worker
+        :param max_inflight: Most unanswered requests per connection before it stops being read
+        :param budget: Seconds per engine move when a session does not ask for a budget
+        :param max_budget: Most seconds per engine move a session may ask for
+        :param grace: Seconds an engine may run over its budget before the server
+        plays a move for it
+        :param seed: Seed for the sessions, None for a random seed
+        """
+
+        self.executor = ProcessPoolExecutor(workers) if executor is None else executor
+        self.max_sessions = max_sessions
+        self.max_inflight = max_inflight
+        self.budget = budget
+        self.max_budget = max_budget
+        self.grace = grace
+        self.rng = random.Random(seed)
+
+        if max_pending is None:
+            max_pending = 4 * (getattr(self.executor, "_max_workers", None) or 1)
+
+        self.pending = asyncio.Semaphore(max_pending)
+
+        self.sessions = dict()
+        self.created = 0
+
+        # engine moves made, those the server had to make after the engine ran
+        # out of time or failed, and the failures among them
+        self.thought = 0
+        self.fallbacks = 0
+        self.failures = 0
+
+    def close(self):
+        self.executor.shutdown()
+
+    async def handle(self, reader, writer):
+
+        """
+        Serves one connection until the client closes it, its
+        sessions are dropped with it
+
+        :param reader: asyncio.StreamReader of the connection
+        :param writer: asyncio.StreamWriter of the connection
+        """
+
+        owned = set()
+        inflight = asyncio.Semaphore(self.max_inflight)
+        writing = asyncio.Lock()
+        tasks = set()
+
+        try:
+
+            while True:
+
+                # stop reading while the connection has too many requests running
+                await inflight.acquire()
+
+                line = await reader.readline()
+                if not line:
+                    inflight.release()
+                    break
+
+                task = asyncio.ensure_future(self.answer(line, owned, writer, writing, inflight))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        finally:
+
+            for number in owned:
+                self.sessions.pop(number, None)
+
+            writer.close()
+
+    async def answer(self, line, owned, writer, writing, inflight):
+
+        """
+        Carries out one request and writes its response
+
+        :param line: Request as a line of JSON
+        :param owned: Ids of the sessions of the connection
+        :param writer: asyncio.StreamWriter of the connection
+        :param writing: Lock held while waiting for the writer to drain
+        :param inflight: Semaphore of the unanswered requests of the connection
+        """
+
+        number = None
+
+        try:
+
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ProtocolError("a request must be a JSON object")
+
+            number = request.get("id")
+            response = await self.dispatch(request, owned)
+            response["ok"] = True
+
+        except (ProtocolError, ValueError) as error:
+            response = {"ok": False, "error": str(error)}
+
+        except Exception as error:
+
+            # a failed engine must not leave the client waiting
+            response = {"ok": False, "error": "internal error: " + repr(error)}
+
+        finally:
+            inflight.release()
+
+        response["id"] = number
+        writer.write((json.dumps(response) + "\n").encode())
+
+        async with writing:
+            await writer.drain()
+
+    async def dispatch(self, request, owned):
+
+        """
+        :param request: Request object
+        :param owned: Ids of the sessions of the connection
+        :return: Response object without its id and ok fields
+        """
+
+        op = request.get("op")
+
+        if op == "new":
+            return await self.new(request, owned)
+
+        if op == "stats":
+            return self.stats()
+
+        session = self.sessions.get(request.get("session"))
+        if session is None or session.id not in owned:
+            raise ProtocolError("no such session")
+
+        if op == "move":
+            return await self.move(session, request.get("column"))
+
+        if op == "state":
+            return session.state()
+
+        if op == "close":
+            owned.discard(session.id)
+            del self.sessions[session.id]
+            return {"session": session.id}
+
+        raise ProtocolError("unknown op " + repr(op))
+
+    async def new(self, request, owned):
+
+        """
+        Starts a session, the engine makes the first move if the client plays MIN
+
+        :param request: Request with the engine as "player", the side of the
+        client as "human" ("max" or "min") and the engine "budget" in seconds
+        :param owned: Ids of the sessions of the connection
+        :return: State of the new session
+        """
+
+        if len(self.sessions) >= self.max_sessions:
+            raise ProtocolError("too many sessions")
+
+        kind = request.get("player", "minimax")
+        if kind not in PLAYERS:
+            raise ProtocolError("unknown player " + repr(kind))
+
+        human = request.get("human", "max")
+        if human not in ("max", "min"):
+            raise ProtocolError("human must be max or min")
+
+        budget = request.get("budget", self.budget)
+        if type(budget) not in (int, float) or budget <= 0:
+            raise ProtocolError("budget must be a positive number of seconds")
+
+        self.created += 1
+
+        session = Session(self.created, kind, human == "max", min(budget, self.max_budget), self.rng.getrandbits(32))
+        self.sessions[session.id] = session
+        owned.add(session.id)
+
+        response = session.state()
+
+        if session.to_move() is session.engine:
+            async with session.lock:
+                response = await self.reply(session)
+
+        return response
+
+    async def move(self, session, column):
+
+        """
+        Plays the move of the client and the answer of the engine
+
+        :param session: Session of the client
+        :param column: Column the client plays
+        :return: State of the session after both moves, with the engine's column
+        """
+
+        if session.lock.locked():
+            raise ProtocolError("the engine is still thinking")
+
+        async with session.lock:
+
+            game = session.game
+
+            if game.utility() is not None:
+                raise ProtocolError("the game is over")
+
+            if session.to_move() is not session.human:
+                raise ProtocolError("not your move")
+
+            if type(column) is not int or column not in game.columns():
+                raise ProtocolError("column " + repr(column) + " is not playable")
+
+            session.game = game.drop(column, session.human)
+
+            if session.game.utility() is not None:
+                return session.state()
+
+            return await self.reply(session)
+
+    async def reply(self, session):
+
+        """
+        Runs the engine move of a session on the executor. If the engine runs
+        past its budget and the grace, or fails, the center most column is
+        played instead, so the session always gets its move. A late search
+        keeps its place in the queue until it finishes.
+
+        :param session: Session with the engine to move
+        :return: State of the session after the move, with the engine's "column",
+        its "seconds", whether it was a "fallback" and the "engine_error" message
+        if the engine failed
+        """
+
+        await self.pending.acquire()
+
+        start = perf_counter()
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, think, session.key, session.kind, session.engine.maximize,
+                                      session.game, session.budget, session.rng.getrandbits(32))
+        future.add_done_callback(self.finished)
+
+        (done, waiting) = await asyncio.wait({future}, timeout=session.budget + self.grace)
+
+        failed = bool(done) and future.exception() is not None
+        fallback = not done or failed
+
+        if fallback:
+            self.fallbacks += 1
+            self.failures += failed
+            column = session.game.columns(True)[0]
+        else:
+            column = future.result()
+
+        self.thought += 1
+        session.game = session.game.drop(column, session.engine)
+
+        response = session.state()
+        response["column"] = column
+        response["seconds"] = perf_counter() - start
+        response["fallback"] = fallback
+
+        if failed:
+            response["engine_error"] = str(future.exception())
+
+        return response
+
+    def finished(self, future):
+
+        """
+        Frees the queue place of an engine move once it is done, late or not
+
+        :param future: Future of the engine move
+        """
+
+        self.pending.release()
+
+        # a late search that failed has nobody waiting for its error
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self):
+
+        return {
+            "sessions": len(self.sessions),
+            "created": self.created,
+            "thought": self.thought,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+        }
+
+    async def serve_socket(self, host="127.0.0.1", port=8765):
+
+        """
+        Serves clients on a TCP socket until cancelled
+
+        :param host: Address to listen on
+        :param port: Port to listen on
+        """
+
+        server = await asyncio.start_server(self.handle, host, port)
+
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdio(self):
+
+        """
+        Serves a single client on stdin and stdout until stdin is closed
+        """
+
+        loop = asyncio.get_running_loop()
+
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+        (transport, protocol) = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+
+        await self.handle(reader, writer)
+
+
+class Client(object):
+
+    """
+    Test client that sends requests over one connection without waiting
+    for the earlier ones to be answered
+    """
+
+    def __init__(self, reader, writer):
+
+        self.reader = reader
+        self.writer = writer
+        self.waiting = dict()
+        self.next_id = 0
+        self.listener = asyncio.ensure_future(self.listen())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765):
+
+        (reader, writer) = await asyncio.open_connection(host, port)
+
+        return cls(reader, writer)
+
+    async def listen(self):
+
+        """
+        Hands every response to the request waiting for it
+        """
+
+        while True:
+
+            line = await self.reader.readline()
+            if not line:
+                break
+
+            response = json.loads(line)
+            self.waiting.pop(response["id"]).set_result(response)
+
+        for future in self.waiting.values():
+            future.set_exception(ConnectionError("the server closed the connection"))
+
+    async def request(self, **fields):
+
+        """
+        :param fields: Fields of the request, without the id
+        :return: Response object
+        """
+
+        self.next_id += 1
+        fields["id"] = self.next_id
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[self.next_id] = future
+
+        self.writer.write((json.dumps(fields) + "\n").encode())
+        await self.writer.drain()
+
+        return await future
+
+    async def close(self):
+
+        self.writer.close()
+        await self.listener
+
+
+async def drive(games, host="127.0.0.1", port=8765, player="random", budget=None, seed=0):
+
+    """
+    Plays many games against a server at once, the client side picking
+    random columns and alternating between MAX and MIN
+
+    :param games: Number of games
+    :param host: Address of the server
+    :param port: Port of the server
+    :param player: Engine to play against
+    :param budget: Seconds per engine move, None for the server default
+    :param seed: Seed of the client moves, game i uses seed + i
+    :return: Dictionary of wins of the client ("human"), of the engine,
+    ties, errors and the seconds the whole run took
+    """
+
+    client = await Client.connect(host, port)
+
+    tally = {"human": 0, "engine": 0, "tie": 0, "errors": 0}
+
+    async def play(index):
+
+        rng = random.Random(seed + index)
+        human = "max" if index % 2 == 0 else "min"
+
+        options = {"op": "new", "player": player, "human": human}
+        if budget is not None:
+            options["budget"] = budget
+
+        state = await client.request(**options)
+
+        while state["ok"] and state["utility"] is None:
+            state = await client.request(op="move", session=state["session"], column=rng.choice(state["columns"]))
+
+        if not state["ok"]:
+            tally["errors"] += 1
+            return
+
+        await client.request(op="close", session=state["session"])
+
+        utility = state["utility"] if human == "max" else -state["utility"]
+        tally["tie" if utility == 0 else "human" if utility == 1 else "engine"] += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(play(index) for index in range(games)))
+    tally["seconds"] = perf_counter() - start
+
+    await client.close()
+
+    return tally
+
+
+async def main(arguments):
+
+    if arguments and arguments[0] == "client":
+
+        games = int(arguments[1]) if len(arguments) > 1 else 1000
+        port = int(arguments[2]) if len(arguments) > 2 else 8765
+
+        print(await drive(games, port=port))
+        return
+
+    server = GameServer()
+
+    try:
+        if arguments and arguments[0] == "stdio":
+            await server.serve_stdio()
+        else:
+            await server.serve_socket(port=int(arguments[0]) if arguments else 8765)
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,372 @@
+"""
+Perfect-play solver with an opening book. Every position up to a given
+number of plies is solved exactly with the minimax players and stored
+in a sorted file of fixed size records, which is memory mapped and
+binary searched when loaded. BookPlayer plays from the book and falls
+back to another player once the game leaves it. A book holds the
+positions of one board size, kept in its header.
+"""
+
+import mmap
+import random
+import struct
+from playing.games.connect_four import ConnectFour, STANDARD, geometry
+from playing.players.minimax import MaxPlayer, MinPlayer, TranspositionTable
+from playing.utils.framework import Player
+
+# file header: magic, version, board width and height, depth and number of records
+HEADER = struct.Struct("<4sHHHHQ")
+MAGIC = b"C4BK"
+VERSION = 3
+
+
+def key_size(tables=STANDARD):
+
+    """
+    :param tables: Geometry of the board
+    :return: Number of bytes of a position key, including the marker bits
+    """
+
+    return (tables.width * tables.column + 7) // 8
+
+
+def record_format(tables=STANDARD, fields="bb"):
+
+    """
+    A record holds the canonical position key, the value for MAX (-1, 0 or 1)
+    and the best column in the orientation of the canonical key. The key is
+    stored big endian in as many bytes as the board needs, so comparing the
+    bytes sorts the records like the keys.
+
+    :param tables: Geometry of the board
+    :param fields: struct format of the fields after the key
+    :return: Struct of a record
+    """
+
+    return struct.Struct("<%ds%s" % (key_size(tables), fields))
+
+
+def to_move(game):
+
+    """
+    MAX makes the first move, so MAX is to move after an even number of pieces
+
+    :param game: ConnectFour game
+    :return: True if MAX is to move
+    """
+
+    return game.count % 2 == 0
+
+
+def positions(root, depth):
+
+    """
+    Enumerates every unfinished position up to depth plies after root,
+    keeping one of every pair of mirror images
+
+    :param root: ConnectFour game to start from
+    :param depth: Number of plies to look ahead
+    :return: Dictionary of canonical position key to game
+    """
+
+    max_player = MaxPlayer()
+    min_player = MinPlayer()
+
+    found = dict()
+    frontier = [root] if root.utility() is None else []
+
+    for ply in range(depth + 1):
+
+        following = []
+
+        for game in frontier:
+
+            key = game.canonical_key()
+            if key in found:
+                continue
+
+            found[key] = game
+
+            if ply == depth:
+                continue
+
+            player = max_player if to_move(game) else min_player
+
+            for move in game.moves():
+
+                child = game.child(move, player)
+                if child.utility() is None:
+                    following.append(child)
+
+        frontier = following
+
+    return found
+
+
+def random_games(count, pieces, seed=None, width=7, height=6):
+
+    """
+    Plays random games up to a number of pieces, the unfinished ones
+    are kept as a set of positions to solve or time
+
+    :param count: Number of positions
+    :param pieces: Number of pieces on the board of every position
+    :param seed: Seed for the random games, None for a random seed
+    :param width: Number of columns
+    :param height: Number of rows
+    :return: List of unfinished ConnectFour games
+    """
+
+    rng = random.Random(seed)
+
+    max_player = MaxPlayer()
+    min_player = MinPlayer()
+
+    games = []
+
+    while len(games) < count:
+
+        game = ConnectFour(width=width, height=height)
+        player, opponent = max_player, min_player
+
+        while game.utility() is None and game.count < pieces:
+
+            game = game.child(rng.choice(game.moves()), player)
+            player, opponent = opponent, player
+
+        if game.utility() is None:
+            games.append(game)
+
+    return games
+
+
+def solve(games, memory=256 * 1024 * 1024):
+
+    """
+    Solves positions exactly, deepest first so the shared
+    transposition table helps the shallower ones
+
+    :param games: Iterable of ConnectFour games
+    :param memory: Memory cap of the transposition table in bytes
+    :return: List of (key, value, column) records sorted by key
+    """
+
+    table = TranspositionTable(memory)
+
+    max_player = MaxPlayer(table)
+    min_player = MinPlayer(table)
+
+    max_player.assume(min_player)
+    min_player.assume(max_player)
+
+    records = []
+
+    for game in sorted(games, key=lambda game: -game.count):
+
+        player = max_player if to_move(game) else min_player
+        value, move = player.value(game)
+
+        records.append((game.canonical_key(), value, game.orient(move)[1]))
+
+    records.sort()
+
+    return records
+
+
+def write_book(path, records, depth, tables=STANDARD, magic=MAGIC, version=VERSION, fields="bb"):
+
+    """
+    Writes records into a book file
+
+    :param path: File to write
+    :param records: (key, value, column) records sorted by key
+    :param depth: Depth the book was built to, kept in the header
+    :param tables: Geometry of the positions
+    :param magic: File type, for files of the same layout with other records
+    :param version: Version of the file type
+    :param fields: struct format of the fields of a record after the key
+    """
+
+    record = record_format(tables, fields)
+    size = key_size(tables)
+
+    with open(path, "wb") as f:
+
+        f.write(HEADER.pack(magic, version, tables.width, tables.height, depth, len(records)))
+
+        for (key, *rest) in records:
+            f.write(record.pack(key.to_bytes(size, "big"), *rest))
+
+
+def build_book(path, depth, root=None, memory=256 * 1024 * 1024):
+
+    """
+    Solves every position up to depth plies and writes the book. Positions
+    near the start of the game take a very long time to solve, so deep
+    books are meant to be built once, offline.
+
+    :param path: File to write
+    :param depth: Number of plies after root to include
+    :param root: ConnectFour game to start from, the empty board by default
+    :param memory: Memory cap of the transposition table in bytes
+    :return: Number of positions in the book
+    """
+
+    if root is None:
+        root = ConnectFour()
+
+    records = solve(positions(root, depth).values(), memory)
+    write_book(path, records, depth, root.geometry)
+
+    return len(records)
+
+
+class Book(object):
+
+    """
+    A book file, memory mapped and searched in place
+    """
+
+    # file type and the struct format of the fields after the key
+    MAGIC = MAGIC
+    VERSION = VERSION
+    FIELDS = "bb"
+
+    def __init__(self, path):
+
+        """
+        :param path: Book file written by build_book
+        """
+
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, width, height, self.depth, self.size) = HEADER.unpack_from(self.map, 0)
+
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(path + " is not a connect four " + self.__class__.__name__.lower())
+
+        self.geometry = geometry(width, height)
+        self.record = record_format(self.geometry, self.FIELDS)
+        self.key_size = key_size(self.geometry)
+
+    def __len__(self):
+        return self.size
+
+    def __reduce__(self):
+
+        # a memory map cannot be pickled, a copy maps the file again
+        return self.__class__, (self.path,)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def lookup(self, game):
+
+        """
+        Binary searches the book for a position
+
+        :param game: ConnectFour game
+        :return: Value for MAX and best column of the position, or None
+        if the position is not in the book or the board has another size
+        """
+
+        found = self.find(game)
+
+        if found is None:
+            return None
+
+        (value, column) = found
+
+        return value, game.orient((0, column))[1]
+
+    def find(self, game):
+
+        """
+        Binary searches the file for the record of a position
+
+        :param game: ConnectFour game
+        :return: Fields of the record after the key, None if the position
+        is not in the file or the board has another size
+        """
+
+        if game.geometry is not self.geometry:
+            return None
+
+        record = self.record
+        key = game.canonical_key().to_bytes(self.key_size, "big")
+
+        low = 0
+        high = self.size
+
+        while low < high:
+
+            middle = (low + high) // 2
+            (found, *fields) = record.unpack_from(self.map, HEADER.size + middle * record.size)
+
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return fields
+
+        return None
+
+
+class BookPlayer(Player):
+
+    """
+    Plays the best move from a Book while the game is in it
+    and asks another player once it is not
+    """
+
+    def __init__(self, player, book):
+
+        """
+        :param player: Fallback Player, already set up with its own opponent
+        :param book: Book to play from
+        """
+
+        self.player = player
+        self.book = book
+        self.opponent = None
+
+    def assume(self, opponent):
+        self.opponent = opponent
+
+    def maximizes(self):
+        return self.player.maximizes()
+
+    def move(self, game, alpha=None, beta=None):
+
+        found = self.book.lookup(game)
+
+        stats = self.stats
+        if stats is not None:
+            stats.reset()
+            if found is None:
+                stats.misses = 1
+            else:
+                stats.hits = 1
+
+        if found is None:
+
+            move = self.player.move(game)
+
+            # an instrumented fallback player reports its own search
+            if stats is not None and self.player.stats is not None:
+                stats.merge(self.player.stats)
+                stats.variation = list(self.player.stats.variation)
+
+            return move
+
+        column = found[1]
+        move = game.geometry.height - 1 - game.height(column), column
+
+        if stats is not None:
+            stats.variation = [move]
+
+        return move
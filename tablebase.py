@@ -0,0 +1,229 @@
+"""
+Endgame tablebase for connect four. Every position reachable from a set
+of roots that has at most a given number of empty cells is solved by
+retrograde analysis: the positions are enumerated layer by layer down to
+the full board, then solved from the last layer back up, every one from
+the values of its children, so no position is ever searched twice.
+
+The results are stored like an opening book (see solver), in a sorted
+file of fixed size records that is memory mapped and binary searched,
+with the number of plies to the end of the game added to every record.
+"""
+
+from playing.games.connect_four import STANDARD
+from playing.games.solver import Book, random_games, to_move, write_book
+from playing.players.minimax import MaxPlayer, MinPlayer
+
+MAGIC = b"C4TB"
+VERSION = 1
+
+# record fields after the key: value for MAX (-1, 0 or 1), best column in
+# the orientation of the canonical key and plies to the end of the game
+FIELDS = "bbB"
+
+# longer than any game, to rank results by value and then by distance
+LONGEST = 256
+
+
+def rank(value, distance):
+
+    """
+    MAX picks the child of the highest rank and MIN the lowest: a win as
+    early as possible, a loss as late as possible
+
+    :param value: Value for MAX of the child
+    :param distance: Plies from the child to the end of the game
+    :return: Rank of the child
+    """
+
+    return value * (LONGEST - distance)
+
+
+def layers(roots, empty):
+
+    """
+    Enumerates every unfinished position reachable from the roots that
+    has at most empty empty cells, keeping one of every pair of mirror
+    images. Roots with more empty cells are played out down to that
+    layer, which only pays off for roots close to it.
+
+    :param roots: ConnectFour games of one board size
+    :param empty: Number of empty cells of the first layer
+    :return: Dictionary of number of pieces to a dictionary of canonical
+    position key to game, for every layer
+    """
+
+    max_player = MaxPlayer()
+    min_player = MinPlayer()
+
+    found = dict()
+    frontier = dict()
+
+    for game in roots:
+        if game.utility() is None:
+            frontier[game.canonical_key()] = game
+
+    while frontier:
+
+        following = dict()
+
+        for (key, game) in frontier.items():
+
+            if game.geometry.cells - game.count <= empty:
+                found.setdefault(game.count, dict())[key] = game
+
+            player = max_player if to_move(game) else min_player
+
+            for move in game.moves():
+
+                child = game.child(move, player)
+
+                if child.utility() is None:
+                    following[child.canonical_key()] = child
+
+        frontier = following
+
+    return found
+
+
+def retrograde(found):
+
+    """
+    Solves the layers from the fullest board back to the first one
+
+    :param found: Layers as returned by layers()
+    :return: List of (key, value, column, distance) records sorted by key
+    """
+
+    max_player = MaxPlayer()
+    min_player = MinPlayer()
+
+    # results of the layer below the one being solved
+    solved = dict()
+    records = []
+
+    for count in sorted(found, reverse=True):
+
+        results = dict()
+
+        for (key, game) in found[count].items():
+
+            maximize = to_move(game)
+            player = max_player if maximize else min_player
+
+            best = None
+
+            for move in game.moves():
+
+                child = game.child(move, player)
+                utility = child.utility()
+
+                if utility is None:
+                    (value, distance) = solved[child.canonical_key()]
+                    distance += 1
+                else:
+                    (value, distance) = (utility, 1)
+
+                order = rank(value, distance)
+
+                if best is None or (order > best[0] if maximize else order < best[0]):
+                    best = (order, value, distance, move)
+
+            (order, value, distance, move) = best
+
+            results[key] = (value, distance)
+            records.append((key, value, game.orient(move)[1], distance))
+
+        solved = results
+
+    records.sort()
+
+    return records
+
+
+def build_tablebase(path, empty, roots=None):
+
+    """
+    Solves every position with at most empty empty cells that is reachable
+    from the roots and writes the tablebase. The positions below a root
+    grow by about a factor of four per empty cell, so from a few dozen
+    roots 10 to 14 empty cells are practical.
+
+    :param path: File to write
+    :param empty: Number of empty cells of the first layer
+    :param roots: ConnectFour games to start from, 100 random positions
+    with empty empty cells by default
+    :return: Number of positions in the tablebase
+    """
+
+    if roots is None:
+        roots = random_games(100, STANDARD.cells - empty, 0)
+
+    roots = list(roots)
+    tables = roots[0].geometry if roots else STANDARD
+
+    records = retrograde(layers(roots, empty))
+    write_book(path, records, empty, tables, MAGIC, VERSION, FIELDS)
+
+    return len(records)
+
+
+class Tablebase(Book):
+
+    """
+    A tablebase file, memory mapped and searched in place. The depth in
+    the header is the number of empty cells of the first layer.
+    """
+
+    MAGIC = MAGIC
+    VERSION = VERSION
+    FIELDS = FIELDS
+
+    def __init__(self, path):
+
+        """
+        :param path: Tablebase file written by build_tablebase
+        """
+
+        Book.__init__(self, path)
+
+        self.empty = self.depth
+
+    def lookup(self, game):
+
+        """
+        Binary searches the tablebase for a position
+
+        :param game: ConnectFour game
+        :return: Value for MAX, best column and plies to the end of the game
+        with best play, or None if the position is not in the tablebase
+        """
+
+        if game.geometry is not self.geometry or self.geometry.cells - game.count > self.empty:
+            return None
+
+        found = self.find(game)
+
+        if found is None:
+            return None
+
+        (value, column, distance) = found
+
+        return value, game.orient((0, column))[1], distance
+
+    def probe(self, game):
+
+        """
+        :param game: ConnectFour game that is not over
+        :return: Value for MAX and best move of the position, or None if
+        the position is not in the tablebase
+        """
+
+        found = self.lookup(game)
+
+        if found is None:
+            return None
+
+        (value, column, distance) = found
+
+        return value, (self.geometry.height - 1 - game.height(column), column)